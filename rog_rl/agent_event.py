@@ -1,10 +1,16 @@
-
-
 from rog_rl.agent_state import AgentState
-import time
 
 
 class AgentEvent:
+    """
+    A single planned state transition of an agent.
+
+    AgentEvents are slotted, and do not stamp the wall clock time,
+    as disease plans can be built for a large number of agents.
+    """
+    __slots__ = (
+        "previous_state", "new_state", "update_timestep", "execution_status")
+
     def __init__(self,
                  previous_state=AgentState.SUSCEPTIBLE,
                  new_state=AgentState.SUSCEPTIBLE,
@@ -14,15 +20,12 @@ class AgentEvent:
         self.new_state = new_state
         self.update_timestep = update_timestep
         self.mark_as_pending()
-        self.created_at = time.time()
-        self.updated_at = time.time()
 
     def mark_as_executed(self):
         """
         Mark that this event has been executed
         """
         self.execution_status = True
-        self.updated_at = time.time()
 
     def mark_as_pending(self):
         """
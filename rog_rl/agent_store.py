@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+import numpy as np
+
+from rog_rl.agent_state import AgentState
+from rog_rl.grid_ops import moore_neighbours
+
+# Marker for the grid cells which do not hold any agent
+NO_AGENT = -1
+# Marker for the transitions which are not scheduled
+NO_TRANSITION = np.iinfo(np.int32).max
+
+
+class AgentStore:
+    """
+    Holds the state of all the agents of a DiseaseSimModel as contiguous
+    typed arrays indexed by the unique_id of the agents :
+        - state : AgentState.value of every agent
+        - pos : (x, y) position of every agent on the grid
+        - is_infection_scheduled : if an infection has already been
+            scheduled for the agent
+        - next_transition_timestep, next_transition_state : the timestep
+            and the target AgentState.value of the next pending state
+            transition of every agent (or NO_TRANSITION)
+        - disease_plan : the timesteps at which every agent is planned to
+            enter the EXPOSED, INFECTIOUS, SYMPTOMATIC and RECOVERED states
+
+    along with the grid itself (`cells` holds the unique_id of the agent
+    in every cell, or NO_AGENT) and the number of agents in every state.
+
+    It also maintains the infection pressure on every cell (the number of
+    INFECTIOUS or SYMPTOMATIC agents in its Moore neighbourhood), along with
+    `at_risk` : a mask of the cells holding a SUSCEPTIBLE agent, without
+    any infection scheduled, under a non zero infection pressure. Both are
+    updated incrementally when agents change state, get an infection
+    scheduled or move.
+    """
+    INFECTIOUS_STATES = (
+        AgentState.INFECTIOUS.value, AgentState.SYMPTOMATIC.value)
+
+    def __init__(self, n_agents, width, height, toric=True):
+        self.n_agents = n_agents
+        self.width = width
+        self.height = height
+        self.toric = toric
+
+        self.state = np.full(
+            n_agents, AgentState.SUSCEPTIBLE.value, dtype=np.int8)
+        self.pos = np.zeros((n_agents, 2), dtype=np.int32)
+        self.is_infection_scheduled = np.zeros(n_agents, dtype=bool)
+        self.next_transition_timestep = np.full(
+            n_agents, NO_TRANSITION, dtype=np.int32)
+        self.next_transition_state = np.full(n_agents, -1, dtype=np.int8)
+        self.disease_plan = np.full(
+            (n_agents, AgentState.RECOVERED.value),
+            NO_TRANSITION, dtype=np.int32)
+
+        self.cells = np.full((width, height), NO_AGENT, dtype=np.int32)
+        self.infection_pressure = np.zeros((width, height), dtype=np.int8)
+        self.at_risk = np.zeros((width, height), dtype=bool)
+
+        self.state_counts = np.zeros(len(AgentState), dtype=np.int64)
+        self.state_counts[AgentState.SUSCEPTIBLE.value] = n_agents
+
+    def reset(self):
+        """
+        Resets all the agents (and the grid) to their initial state,
+        reusing the existing arrays
+        """
+        self.state.fill(AgentState.SUSCEPTIBLE.value)
+        self.pos.fill(0)
+        self.is_infection_scheduled.fill(False)
+        self.next_transition_timestep.fill(NO_TRANSITION)
+        self.next_transition_state.fill(-1)
+        self.disease_plan.fill(NO_TRANSITION)
+
+        self.cells.fill(NO_AGENT)
+        self.infection_pressure.fill(0)
+        self.at_risk.fill(False)
+
+        self.state_counts.fill(0)
+        self.state_counts[AgentState.SUSCEPTIBLE.value] = self.n_agents
+
+    def get_agent_ids_by_state(self, state: AgentState):
+        return np.flatnonzero(self.state == state.value)
+
+    def get_agent_id(self, x, y):
+        return self.cells[x, y]
+
+    def is_infectious(self, agent_ids):
+        return np.isin(self.state[agent_ids], self.INFECTIOUS_STATES)
+
+    def set_state(self, agent_ids, new_states):
+        """
+        Sets the state of the provided agents,
+        and returns their previous states
+        """
+        agent_ids = np.atleast_1d(agent_ids)
+        was_infectious = self.is_infectious(agent_ids)
+        previous_states = self.state[agent_ids]
+        self.state[agent_ids] = new_states
+        n_states = len(AgentState)
+        self.state_counts -= np.bincount(previous_states, minlength=n_states)
+        self.state_counts += np.bincount(
+            self.state[agent_ids], minlength=n_states)
+
+        is_infectious = self.is_infectious(agent_ids)
+        self.add_infection_pressure(
+            agent_ids[is_infectious & ~was_infectious], 1)
+        self.add_infection_pressure(
+            agent_ids[was_infectious & ~is_infectious], -1)
+        self.update_at_risk(self.pos[agent_ids, 0], self.pos[agent_ids, 1])
+        return previous_states
+
+    def schedule_infections(self, agent_ids):
+        """
+        Marks the provided agents as having an infection scheduled
+        """
+        self.is_infection_scheduled[agent_ids] = True
+        self.update_at_risk(self.pos[agent_ids, 0], self.pos[agent_ids, 1])
+
+    def add_infection_pressure(self, agent_ids, delta):
+        """
+        Adds delta to the infection pressure of all the cells
+        in the neighbourhood of the provided agents, and updates
+        the at_risk mask accordingly
+        """
+        if len(agent_ids) == 0:
+            return
+        nx, ny, inside = moore_neighbours(
+            self.pos[agent_ids, 0], self.pos[agent_ids, 1],
+            self.cells.shape, toric=self.toric)
+        nx, ny = nx[inside], ny[inside]
+        np.add.at(self.infection_pressure, (nx, ny), delta)
+        self.update_at_risk(nx, ny)
+
+    def update_at_risk(self, xs, ys):
+        """
+        Recomputes the at_risk mask on the provided cells
+        """
+        agent_ids = self.cells[xs, ys]
+        is_occupied = agent_ids != NO_AGENT
+        agent_ids = agent_ids[is_occupied]
+        self.at_risk[xs, ys] = False
+        self.at_risk[xs[is_occupied], ys[is_occupied]] = \
+            (self.state[agent_ids] == AgentState.SUSCEPTIBLE.value) & \
+            ~self.is_infection_scheduled[agent_ids] & \
+            (self.infection_pressure[
+                xs[is_occupied], ys[is_occupied]] > 0)
+
+    def get_at_risk_cells(self):
+        """
+        Returns the (x, y) coordinates of the cells in the at_risk mask,
+        in a deterministic order
+        """
+        return np.unravel_index(
+            np.flatnonzero(self.at_risk), self.cells.shape)
+
+    def place(self, agent_ids, xs, ys):
+        """
+        Places the provided agents on the (empty) provided cells
+        """
+        self.pos[agent_ids, 0] = xs
+        self.pos[agent_ids, 1] = ys
+        self.cells[xs, ys] = agent_ids
+        self.update_at_risk(xs, ys)
+
+    def move(self, agent_ids, xs, ys):
+        """
+        Moves the provided agents to the (empty) provided cells
+        """
+        agent_ids, xs, ys = np.atleast_1d(agent_ids, xs, ys)
+        infectious_ids = agent_ids[self.is_infectious(agent_ids)]
+        self.add_infection_pressure(infectious_ids, -1)
+        old_xs, old_ys = self.pos[agent_ids, 0], self.pos[agent_ids, 1]
+        self.cells[old_xs, old_ys] = NO_AGENT
+        self.at_risk[old_xs, old_ys] = False
+        self.place(agent_ids, xs, ys)
+        self.add_infection_pressure(infectious_ids, 1)
+
+
+class AgentGridView:
+    """
+    Mimics the parts of the mesa SingleGrid API which the visualizations
+    rely on (grid[x][y], get_cell_list_contents, etc), on top of the
+    cells array of the AgentStore of a DiseaseSimModel.
+
+    The agents are returned as lightweight DiseaseSimAgent views.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.width = model.width
+        self.height = model.height
+        self.torus = model.toric
+
+    def __getitem__(self, x):
+        return [
+            None if _agent_id == NO_AGENT else self.model.get_agent(_agent_id)
+            for _agent_id in self.model.agent_store.cells[x].tolist()
+        ]
+
+    def is_cell_empty(self, pos):
+        x, y = pos
+        return self.model.agent_store.cells[x, y] == NO_AGENT
+
+    def get_cell_list_contents(self, cell_list):
+        if isinstance(cell_list, tuple):
+            cell_list = [cell_list]
+        return [
+            self.model.get_agent(self.model.agent_store.cells[x, y])
+            for x, y in cell_list
+            if not self.is_cell_empty((x, y))
+        ]
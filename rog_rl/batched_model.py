@@ -0,0 +1,469 @@
+import random
+
+import numpy as np
+
+from rog_rl.agent_state import AgentState
+from rog_rl.disease_planner import SEIRDiseasePlanner
+from rog_rl.vaccination_response import VaccinationResponse
+from rog_rl.numpy_model import EMPTY_CELL, NO_TRANSITION, \
+    VACCINATION_RESPONSES
+from rog_rl import grid_ops
+from rog_rl import observation as observation_utils
+
+
+# VaccinationResponse.value for every cell state (offset by 1, to account
+# for EMPTY_CELL)
+VACCINATION_RESPONSE_BY_STATE = np.array(
+    [VaccinationResponse.CELL_EMPTY.value,
+     VaccinationResponse.VACCINATION_SUCCESS.value] +
+    [VACCINATION_RESPONSES[_state].value for _state in AgentState
+     if _state != AgentState.SUSCEPTIBLE]
+)
+
+
+class BatchedDiseaseSimModel:
+    """
+    Holds n_envs independent simulations (with the same configuration)
+    as stacked cell arrays of shape (n_envs, width, height), and advances
+    all of them with whole-array operations.
+
+    The per-simulation dynamics are the same as the ones of
+    NumpyDiseaseSimModel. Every simulation keeps its own timestep,
+    vaccine budget, running flag and R0 statistics, so any subset of
+    them can be ticked, vaccinated or reset independently.
+    """
+
+    def __init__(
+        self,
+        n_envs=1,
+        width=50,
+        height=50,
+        population_density=0.75,
+        vaccine_density=0,
+        initial_infection_fraction=0.1,
+        initial_vaccination_fraction=0.00,
+        prob_infection=0.2,
+        prob_agent_movement=0.0,
+        disease_planner_config={
+            "latent_period_mu":  2 * 4,
+            "latent_period_sigma":  0,
+            "incubation_period_mu":  5 * 4,
+            "incubation_period_sigma":  0,
+            "recovery_period_mu":  14 * 4,
+            "recovery_period_sigma":  0,
+        },
+        max_timesteps=200,
+        early_stopping_patience=14,
+        toric=True,
+        seed=None,
+        observation_mode="one_hot",
+        observation_dtype="float32",
+        observation_layout="whc",
+        stop_on_epidemic_end=True
+    ):
+        assert 0 < population_density <= 1, \
+            "population_density should be between (0, 1]"
+
+        self.n_envs = n_envs
+        self.width = width
+        self.height = height
+        self.population_density = population_density
+        self.vaccine_density = vaccine_density
+        self.initial_infection_fraction = initial_infection_fraction
+        self.initial_vaccination_fraction = initial_vaccination_fraction
+        self.prob_infection = prob_infection
+        self.prob_agent_movement = prob_agent_movement
+        self.disease_planner_config = disease_planner_config
+        self.max_timesteps = max_timesteps
+        self.early_stopping_patience = early_stopping_patience
+        self.toric = toric
+        self.observation_mode = observation_mode
+        self.observation_dtype = observation_dtype
+        self.observation_layout = observation_layout
+        self.stop_on_epidemic_end = stop_on_epidemic_end
+
+        self.n_agents = int(width * height * population_density)
+        self.n_initial_vaccines = int(self.n_agents * vaccine_density)
+        self.n_agents_to_infect = int(
+            initial_infection_fraction * self.n_agents)
+        self.n_agents_to_vaccinate = int(
+            initial_vaccination_fraction * self.n_agents)
+        self.max_vaccines = \
+            self.n_initial_vaccines + self.n_agents_to_vaccinate
+
+        self.disease_planner = SEIRDiseasePlanner(**disease_planner_config)
+        self.seed(seed)
+
+        shape = (n_envs, width, height)
+        self.state = np.full(shape, EMPTY_CELL, dtype=np.int8)
+        self.agent_ids = np.full(shape, -1, dtype=np.int32)
+        self.disease_plan = np.full(
+            (AgentState.RECOVERED.value, ) + shape,
+            NO_TRANSITION, dtype=np.int32)
+        self.observation_buffer = observation_utils.allocate_observation(
+            shape,
+            observation_mode=observation_mode,
+            observation_dtype=observation_dtype,
+            observation_layout=observation_layout)
+        self.observation = observation_utils.grid_view(
+            self.observation_buffer, observation_layout)
+
+        self.steps = np.zeros(n_envs, dtype=np.int64)
+        self.running = np.zeros(n_envs, dtype=bool)
+        self.n_vaccines = np.zeros(n_envs, dtype=np.int64)
+        self.state_counts = np.zeros((n_envs, len(AgentState)), dtype=np.int64)
+
+        # R0 statistics : number of infections spread by every agent,
+        # the total number of infections spread, and the number of agents
+        # who have spread at least one infection
+        self.infection_counts = np.zeros(
+            (n_envs, self.n_agents), dtype=np.int32)
+        self.n_infections_spread = np.zeros(n_envs, dtype=np.int64)
+        self.n_infectors = np.zeros(n_envs, dtype=np.int64)
+
+        # Early stopping statistics : the last recorded number of
+        # susceptible agents, and for how many consecutive records
+        # it has stayed the same
+        self.last_susceptible_count = np.zeros(n_envs, dtype=np.int64)
+        self.susceptible_streak = np.zeros(n_envs, dtype=np.int64)
+
+    def seed(self, seed=None):
+        """
+        Seeds the random number generator shared by all the simulations
+        """
+        _seed = random.Random(seed).getrandbits(64)
+        self.np_random = np.random.default_rng(_seed)
+        self.disease_planner.set_np_random(self.np_random)
+
+    ###########################################################################
+    ###########################################################################
+    # Setup
+    ###########################################################################
+    def reset(self, env_ids=None):
+        """
+        Reinitializes the simulations with the provided env_ids
+        (or all of them) in place
+        """
+        if env_ids is None:
+            env_ids = np.arange(self.n_envs)
+
+        for _env_id in env_ids:
+            self.state[_env_id] = EMPTY_CELL
+            self.agent_ids[_env_id] = -1
+            self.disease_plan[:, _env_id] = NO_TRANSITION
+
+            # Position all the agents at random (distinct) cells
+            cells = self.np_random.choice(
+                self.width * self.height, size=self.n_agents, replace=False)
+            xs, ys = np.unravel_index(cells, (self.width, self.height))
+            es = np.full(self.n_agents, _env_id)
+            self.agent_ids[_env_id, xs, ys] = np.arange(self.n_agents)
+            self.state[_env_id, xs, ys] = AgentState.SUSCEPTIBLE.value
+
+            # Seed the infection in a fraction of the agents
+            _infected = slice(0, self.n_agents_to_infect)
+            self.steps[_env_id] = 0
+            self.schedule_infections(
+                (es[_infected], xs[_infected], ys[_infected]))
+
+            # Seed the vaccination in a fraction of the agents
+            _vaccinated = slice(
+                self.n_agents_to_infect,
+                self.n_agents_to_infect + self.n_agents_to_vaccinate)
+            self.state[_env_id, xs[_vaccinated], ys[_vaccinated]] = \
+                AgentState.VACCINATED.value
+
+            self.state_counts[_env_id] = np.bincount(
+                self.state[_env_id, xs, ys], minlength=len(AgentState))
+            observation_utils.write_grid(
+                self.observation[_env_id], self.state[_env_id])
+
+        self.running[env_ids] = True
+        self.n_vaccines[env_ids] = self.n_initial_vaccines
+        self.infection_counts[env_ids] = 0
+        self.n_infections_spread[env_ids] = 0
+        self.n_infectors[env_ids] = 0
+        self.last_susceptible_count[env_ids] = \
+            self.state_counts[env_ids, AgentState.SUSCEPTIBLE.value]
+        self.susceptible_streak[env_ids] = 1
+
+    ###########################################################################
+    ###########################################################################
+    # State Aggregation
+    ###########################################################################
+    def get_observation(self, out=None):
+        """
+        Returns the observations of all the simulations (in the
+        observation_layout), or copies them into `out` if provided
+        """
+        if out is None:
+            return self.observation_buffer
+        np.copyto(out, self.observation_buffer)
+        return out
+
+    def get_population_fraction_by_state(self, state: AgentState):
+        return self.state_counts[:, state.value] / self.n_agents
+
+    def compute_R0(self):
+        """
+        Returns the R0 of every simulation, based on all
+        the infections spread in them
+        """
+        return np.divide(
+            self.n_infections_spread, self.n_infectors,
+            out=np.zeros(self.n_envs), where=self.n_infectors > 0)
+
+    def update_observation(self, cells):
+        """
+        Rewrites the observation at the provided cells (an index tuple)
+        from the cell state array
+        """
+        observation_utils.write_cells(
+            self.observation, cells, self.state[cells])
+
+    def update_state_counts(self, env_ids, previous_state, new_state):
+        n_states = len(AgentState)
+        minlength = self.n_envs * n_states
+        self.state_counts -= np.bincount(
+            env_ids * n_states + previous_state,
+            minlength=minlength).reshape(self.n_envs, n_states)
+        self.state_counts += np.bincount(
+            env_ids * n_states + new_state,
+            minlength=minlength).reshape(self.n_envs, n_states)
+
+    ###########################################################################
+    ###########################################################################
+    # Actions
+    ###########################################################################
+    def tick(self, env_mask=None):
+        """
+        Advances the simulations marked in env_mask (or all of them)
+        by a single timestep
+        """
+        if env_mask is None:
+            env_mask = np.ones(self.n_envs, dtype=bool)
+        self.propagate_infections(env_mask)
+        self.record_metrics(env_mask)
+        self.move_agents(env_mask)
+        self.progress_disease(env_mask)
+        self.steps[env_mask] += 1
+        self.simulation_completion_checks(env_mask)
+
+    def run_to_completion(self, env_mask):
+        """
+        Ticks the simulations marked in env_mask until they stop running
+        """
+        env_mask = env_mask & self.running
+        while env_mask.any():
+            self.tick(env_mask)
+            env_mask &= self.running
+
+    def vaccinate_cells(self, env_ids, cell_xs, cell_ys):
+        """
+        Attempts to vaccinate the agents at (cell_xs[i], cell_ys[i]) in
+        the simulation env_ids[i], for every i
+
+        Responds with :
+        (is_vaccination_successful, vaccination_response)
+        as arrays of booleans, and of VaccinationResponse values
+        """
+        env_ids = np.asarray(env_ids)
+        cell_xs = np.asarray(cell_xs)
+        cell_ys = np.asarray(cell_ys)
+
+        responses = np.full(
+            len(env_ids), VaccinationResponse.AGENT_VACCINES_EXHAUSTED.value)
+        has_vaccines = self.n_vaccines[env_ids] > 0
+        np.subtract.at(self.n_vaccines, env_ids[has_vaccines], 1)
+
+        cell_state = self.state[env_ids, cell_xs, cell_ys]
+        responses[has_vaccines] = \
+            VACCINATION_RESPONSE_BY_STATE[cell_state[has_vaccines] + 1]
+
+        success = responses == VaccinationResponse.VACCINATION_SUCCESS.value
+        cells = (env_ids[success], cell_xs[success], cell_ys[success])
+        self.state[cells] = AgentState.VACCINATED.value
+        self.disease_plan[(slice(None), ) + cells] = NO_TRANSITION
+        self.update_state_counts(
+            cells[0],
+            AgentState.SUSCEPTIBLE.value, AgentState.VACCINATED.value)
+        self.update_observation(cells)
+        return success, responses
+
+    ###########################################################################
+    ###########################################################################
+    # Misc
+    ###########################################################################
+    def record_metrics(self, env_mask):
+        """
+        Records the susceptible population of the simulations marked in
+        env_mask, for the early stopping checks
+        """
+        susceptible_count = self.state_counts[:, AgentState.SUSCEPTIBLE.value]
+        unchanged = susceptible_count == self.last_susceptible_count
+        self.susceptible_streak[env_mask] = np.where(
+            unchanged, self.susceptible_streak + 1, 1)[env_mask]
+        self.last_susceptible_count[env_mask] = susceptible_count[env_mask]
+
+    def simulation_completion_checks(self, env_mask):
+        """
+        A simulation is complete if :
+            - if the timesteps have exceeded the number of max_timesteps
+            or
+            - the fraction of susceptible population is <= 0
+            or
+            - the fraction of susceptible population has not changed since the
+            last N timesteps
+
+        If stop_on_epidemic_end is set, the simulations without EXPOSED,
+        INFECTIOUS or SYMPTOMATIC agents left are also stopped, after
+        fast forwarding them to the timestep at which the checks above
+        would have stopped them
+        """
+        susceptible_count = self.state_counts[:, AgentState.SUSCEPTIBLE.value]
+        completed = (self.steps > self.max_timesteps - 1) | \
+            (susceptible_count <= 0) | \
+            ((self.steps > self.early_stopping_patience) &
+             (self.susceptible_streak >= self.early_stopping_patience))
+        self.running[env_mask & completed] = False
+        if not self.stop_on_epidemic_end:
+            return
+
+        ended = env_mask & self.running & (self.state_counts[
+            :, AgentState.EXPOSED.value:AgentState.SYMPTOMATIC.value + 1
+        ].sum(axis=1) == 0)
+        if not ended.any():
+            return
+        # The susceptible streak after j more records is streak + j
+        streak = np.where(
+            susceptible_count == self.last_susceptible_count,
+            self.susceptible_streak, 0)
+        patience = self.early_stopping_patience
+        n_ticks = np.minimum(
+            np.maximum(self.max_timesteps - self.steps, 1),
+            np.maximum.reduce([
+                np.full(self.n_envs, patience + 1) - self.steps,
+                patience - streak,
+                np.ones(self.n_envs, dtype=np.int64)]))
+        self.steps[ended] += n_ticks[ended]
+        self.susceptible_streak[ended] = streak[ended] + n_ticks[ended]
+        self.last_susceptible_count[ended] = susceptible_count[ended]
+        self.running[ended] = False
+
+    def schedule_infections(self, cells):
+        """
+        Prepares the disease plan for the agents at the provided cells
+        (an index tuple), starting at the current timestep of their
+        simulations
+        """
+        disease_plans = self.disease_planner.get_disease_plans(
+            len(cells[0]), base_timestep=self.steps[cells[0]])
+        self.disease_plan[(slice(None), ) + cells] = disease_plans.T
+
+    def propagate_infections(self, env_mask):
+        """
+        Propagates infection during a single simulation step in
+        the simulations marked in env_mask
+        """
+        infectious = ((self.state == AgentState.INFECTIOUS.value) |
+                      (self.state == AgentState.SYMPTOMATIC.value)) & \
+            env_mask[:, None, None]
+        if not infectious.any():
+            return
+
+        infection_pressure = grid_ops.count_neighbours(
+            infectious, toric=self.toric)
+        at_risk = (self.state == AgentState.SUSCEPTIBLE.value) & \
+            (self.disease_plan[AgentState.SUSCEPTIBLE.value] == NO_TRANSITION) & \
+            (infection_pressure > 0)  # noqa
+        cells = np.nonzero(at_risk)
+
+        prob_by_pressure = 1 - (1 - self.prob_infection) ** np.arange(9)
+        infected = self.np_random.random(len(cells[0])) < \
+            prob_by_pressure[infection_pressure[cells]]
+        cells = tuple(_index[infected] for _index in cells)
+        if len(cells[0]) == 0:
+            return
+
+        self.schedule_infections(cells)
+
+        # Attribute every infection to one of the infectious neighbours
+        # at random, and update the R0 statistics
+        chosen = grid_ops.choose_neighbours(
+            grid_ops.neighbour_stack(
+                infectious, toric=self.toric)[(slice(None), ) + cells],
+            self.np_random)
+        infector_ids = self.agent_ids[grid_ops.neighbour_cells(
+            cells, np.array(grid_ops.MOORE_OFFSETS)[chosen],
+            self.state.shape)]
+        env_ids = cells[0]
+
+        first_infection = self.infection_counts[env_ids, infector_ids] == 0
+        np.add.at(self.infection_counts, (env_ids, infector_ids), 1)
+        self.n_infections_spread += np.bincount(
+            env_ids, minlength=self.n_envs)
+        new_infectors = np.unique(
+            env_ids[first_infection] * self.n_agents +
+            infector_ids[first_infection])
+        self.n_infectors += np.bincount(
+            new_infectors // self.n_agents, minlength=self.n_envs)
+
+    def move_agents(self, env_mask):
+        """
+        Moves every agent in the simulations marked in env_mask, with
+        a probability of prob_agent_movement, to a random empty cell
+        in its neighbourhood
+        """
+        if self.prob_agent_movement <= 0:
+            return
+        occupied = self.state != EMPTY_CELL
+        movers = occupied & env_mask[:, None, None] & \
+            (self.np_random.random(occupied.shape) < self.prob_agent_movement)
+        sources, targets = grid_ops.resolve_moves(
+            occupied, np.nonzero(movers), self.toric, self.np_random)
+
+        for _array in [self.state, self.agent_ids]:
+            _array[targets] = _array[sources]
+        _plan_targets = (slice(None), ) + targets
+        _plan_sources = (slice(None), ) + sources
+        self.disease_plan[_plan_targets] = self.disease_plan[_plan_sources]
+        self.state[sources] = EMPTY_CELL
+        self.agent_ids[sources] = -1
+        self.disease_plan[_plan_sources] = NO_TRANSITION
+
+        self.update_observation(tuple(
+            np.concatenate([_source, _target])
+            for _source, _target in zip(sources, targets)))
+
+    def progress_disease(self, env_mask):
+        """
+        Executes all the state transitions due at the current timestep
+        of the simulations marked in env_mask
+        """
+        _state = np.minimum(self.state, AgentState.SYMPTOMATIC.value)
+        _state[_state == EMPTY_CELL] = 0
+        due = (self.state != EMPTY_CELL) & \
+            (self.state <= AgentState.SYMPTOMATIC.value) & \
+            env_mask[:, None, None] & \
+            (np.take_along_axis(self.disease_plan, _state[None], axis=0)[0] <=
+             self.steps[:, None, None])
+        cells = np.nonzero(due)
+        updated_cells = cells
+
+        # The loop handles the (rare) cases where more than one transition
+        # of the same agent is due at the same timestep
+        while len(cells[0]) > 0:
+            previous_state = self.state[cells]
+            self.state[cells] += 1
+            self.update_state_counts(
+                cells[0], previous_state, previous_state + 1)
+
+            new_state = previous_state + 1
+            still_due = (new_state <= AgentState.SYMPTOMATIC.value)
+            _cells = tuple(_index[still_due] for _index in cells)
+            still_due[still_due] = \
+                self.disease_plan[(new_state[still_due], ) + _cells] <= \
+                self.steps[_cells[0]]
+            cells = tuple(_index[still_due] for _index in cells)
+
+        self.update_observation(updated_cells)
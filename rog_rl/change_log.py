@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+import numpy as np
+
+
+class ChangeLog:
+    """
+    Keeps track of the cells of a simulation which changed since
+    the last time the changes were reported.
+
+    The models record every cell they touch (when agents change state
+    or move), and `flush` reports the net changes since the previous
+    flush as an int32 array of (x, y, old_state, new_state) rows, where
+    the states are AgentState values (or -1 for the empty cells).
+    """
+
+    def __init__(self, cell_states):
+        # The cell states as of the last flush
+        self.cell_states = np.array(cell_states, dtype=np.int8)
+        self._touched_xs = []
+        self._touched_ys = []
+
+    def record(self, xs, ys):
+        """
+        Records that the provided cells might have changed
+        """
+        self._touched_xs.append(np.atleast_1d(xs))
+        self._touched_ys.append(np.atleast_1d(ys))
+
+    def flush(self, model):
+        """
+        Returns the net changes of the cells since the last flush,
+        as an array of shape (n_changes, 4) holding
+        (x, y, old_state, new_state) rows
+        """
+        if len(self._touched_xs) == 0:
+            return np.zeros((0, 4), dtype=np.int32)
+
+        cells = np.unique(np.ravel_multi_index(
+            (np.concatenate(self._touched_xs),
+             np.concatenate(self._touched_ys)),
+            self.cell_states.shape))
+        self._touched_xs = []
+        self._touched_ys = []
+
+        xs, ys = np.unravel_index(cells, self.cell_states.shape)
+        old_states = self.cell_states[xs, ys]
+        new_states = model.get_cell_states(xs, ys)
+        self.cell_states[xs, ys] = new_states
+
+        changed = old_states != new_states
+        return np.stack(
+            [xs, ys, old_states, new_states], axis=1
+        )[changed].astype(np.int32)
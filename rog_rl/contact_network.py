@@ -1,42 +1,100 @@
 #!/usr/bin/env python
 import numpy as np
 
+# Marker for the agents which have not been infected by another agent
+NO_INFECTOR = -1
+
 
 class ContactNetwork:
     """
     This keeps a record of all the "contacts" that happen in a
     single simulation
+
+    As every agent can be infected at most once, the transmission tree
+    is held as a parent array (the unique_id of the infector of every
+    agent, or NO_INFECTOR) along with the timestep of every infection.
+
+    The number of infections spread by every agent, and the number of
+    distinct infectors are maintained on every registered infection,
+    so that R0 can be computed in constant time.
     """
-    def __init__(self):
-        self.contact_network = {}
-        self.infection_network = {}
-        self.infection_counter = {}
+    def __init__(self, n_agents):
+        self.n_agents = n_agents
+        self.infector = np.full(n_agents, NO_INFECTOR, dtype=np.int32)
+        self.infection_timestep = np.full(n_agents, -1, dtype=np.int32)
+        self.infection_counter = np.zeros(n_agents, dtype=np.int32)
+
+        self.n_infections_spread = 0
+        self.n_infectors = 0
+
+    def reset(self):
+        """
+        Forgets all the registered infections, reusing the existing arrays
+        """
+        self.infector.fill(NO_INFECTOR)
+        self.infection_timestep.fill(-1)
+        self.infection_counter.fill(0)
+
+        self.n_infections_spread = 0
+        self.n_infectors = 0
 
     def register_contact(self, agent_a, agent_b):
         raise NotImplementedError()
 
-    def register_infection_spread(self, agent_a, agent_b):
+    def register_infection_spread(self, agent_a, agent_b, timestep=-1):
         """
         Register the fact that agent_a infected agent_b
         """
-        agent_a_id = agent_a.unique_id
-        agent_b_id = agent_b.unique_id
+        self.register_infection_spread_by_id(
+            agent_a.unique_id, agent_b.unique_id, timestep)
 
-        try:
-            self.infection_network[agent_a_id]
-        except KeyError:
-            self.infection_network[agent_a_id] = set()
-            self.infection_counter[agent_a_id] = 0
+    def register_infection_spread_by_id(
+            self, agent_a_id, agent_b_id, timestep=-1):
+        """
+        Register the fact that the agent with the unique_id agent_a_id
+        infected the agent with the unique_id agent_b_id
+        """
+        if self.infector[agent_b_id] != NO_INFECTOR:
+            raise Exception(
+                "Attempt to register multiple infections of the same agent")
+        self.infector[agent_b_id] = agent_a_id
+        self.infection_timestep[agent_b_id] = timestep
 
-        self.infection_network[agent_a_id].add(agent_b_id)
+        if self.infection_counter[agent_a_id] == 0:
+            self.n_infectors += 1
         self.infection_counter[agent_a_id] += 1
+        self.n_infections_spread += 1
+
+    def register_infection_spreads_by_id(
+            self, agent_a_ids, agent_b_ids, timestep=-1):
+        """
+        Bulk version of register_infection_spread_by_id, where
+        agent_a_ids[k] infected agent_b_ids[k]
+        (agent_b_ids are expected to be distinct)
+        """
+        if np.any(self.infector[agent_b_ids] != NO_INFECTOR):
+            raise Exception(
+                "Attempt to register multiple infections of the same agent")
+        self.infector[agent_b_ids] = agent_a_ids
+        self.infection_timestep[agent_b_ids] = timestep
+
+        infectors, counts = np.unique(agent_a_ids, return_counts=True)
+        self.n_infectors += int(
+            np.count_nonzero(self.infection_counter[infectors] == 0))
+        self.infection_counter[infectors] += counts
+        self.n_infections_spread += len(agent_b_ids)
+
+    def get_infected_by(self, agent_id):
+        """
+        Returns the unique_ids of all the agents infected by an agent
+        """
+        return np.flatnonzero(self.infector == agent_id)
 
     def compute_R0(self):
         """
         Returns the value of R0 based on all
         the registered infections
         """
-        if len(self.infection_counter.keys()) == 0:
+        if self.n_infectors == 0:
             return 0
-        # TODO- This can be optimized by computing a running mean
-        return np.array(list(self.infection_counter.values())).mean()
+        return self.n_infections_spread / self.n_infectors
@@ -1,6 +1,33 @@
+import numpy as np
+
 from rog_rl.agent_event import AgentEvent
 from rog_rl.agent_state import AgentState
 
+# Number of rounds of plain rejection sampling attempted, before sampling
+# the remaining periods directly from the tail of their distribution
+MAX_REJECTION_ROUNDS = 8
+
+
+def sample_standard_normal_tail(np_random, lower_bound):
+    """
+    Samples standard normal values conditioned to be >= lower_bound
+    (an array), using the exponential proposals of
+    Robert (1995), "Simulation of truncated normal variables", which stay
+    efficient even far out in the tail
+    """
+    lower_bound = np.asarray(lower_bound, dtype=np.float64)
+    alpha = (lower_bound + np.sqrt(lower_bound ** 2 + 4)) / 2
+    samples = np.empty(lower_bound.shape)
+    pending = np.arange(len(lower_bound))
+    while len(pending) > 0:
+        z = lower_bound[pending] + \
+            np_random.exponential(size=len(pending)) / alpha[pending]
+        accepted = np_random.random(len(pending)) < \
+            np.exp(-(z - alpha[pending]) ** 2 / 2)
+        samples[pending[accepted]] = z[accepted]
+        pending = pending[~accepted]
+    return samples
+
 
 class DiseasePlannerBase:
     """
@@ -36,7 +63,9 @@ class SEIRDiseasePlanner(DiseasePlannerBase):
                  incubation_period_sigma=3 * 4,
                  recovery_period_mu=14 * 4,
                  recovery_period_sigma=1 * 4,
-                 random=False
+                 random=False,
+                 np_random=None,
+                 pool_size=1024
                  ):
 
         self.latent_period_mu = latent_period_mu
@@ -65,10 +94,64 @@ class SEIRDiseasePlanner(DiseasePlannerBase):
                 "Expected : Latent Period < Incubation Period < Recover Period"
             )
 
+        self.initialize_random(random, np_random, pool_size)
+
+    def initialize_random(self, random, np_random, pool_size):
+        """
+        Sets up the random number generators, and the pool of
+        pre-sampled disease progressions.
+
+        The disease progressions are sampled in bulk with the numpy
+        random number generator (np_random), which is seeded from
+        the `random` module (or the provided random.Random instance)
+        if not provided.
+        """
         self.random = random
         if not self.random:
             import random
             self.random = random
+        if np_random is None:
+            np_random = np.random.default_rng(self.random.getrandbits(64))
+        self.pool_size = pool_size
+        self.set_np_random(np_random)
+
+    def set_np_random(self, np_random):
+        """
+        Sets the numpy random number generator used for sampling the
+        disease progressions, and discards the pool sampled with
+        the previous one
+        """
+        self.np_random = np_random
+        self._pool = np.zeros((0, 3), dtype=np.int32)
+        self._pool_index = 0
+        self._pool_key = None
+        self._template = None
+        self._template_key = None
+
+    def is_deterministic(self):
+        """
+        Returns True if all the disease plans are identical
+        (up to their base_timestep), i.e. when all the sigmas are 0
+        """
+        return self.latent_period_sigma == 0 and \
+            self.incubation_period_sigma == 0 and \
+            self.recovery_period_sigma == 0
+
+    def get_disease_progression_template(self):
+        """
+        Returns the (latent, incubation, recovery) periods shared by all
+        the disease plans of a deterministic planner, as a read-only
+        array (which is only rebuilt if the periods change)
+        """
+        _template_key = (
+            self.latent_period_mu,
+            self.incubation_period_mu,
+            self.recovery_period_mu)
+        if self._template_key != _template_key:
+            self._template = self.sample_disease_progressions(1)[0]
+            self._template.setflags(write=False)
+            self._template_key = _template_key
+        return self._template
 
     def get_disease_plan(self, base_timestep=0):
         """
@@ -81,11 +164,105 @@ class SEIRDiseasePlanner(DiseasePlannerBase):
             base_timestep
         )
 
+    def get_disease_plans(self, n, base_timestep=0):
+        """
+        Plans out the schedule of the state transitions of n infections
+        at once.
+
+        Returns an int32 array of shape (n, 4), holding for every
+        infection the timesteps at which the agent enters the EXPOSED,
+        INFECTIOUS, SYMPTOMATIC and RECOVERED states.
+        base_timestep can either be a scalar, or an array of n timesteps.
+        """
+        disease_plans = np.zeros((n, 4), dtype=np.int32)
+        disease_plans[:, 1:] = self.get_disease_progressions(n)
+        disease_plans += np.asarray(
+            base_timestep, dtype=np.int32).reshape(-1, 1)
+        return disease_plans
+
+    def get_disease_progressions(self, n):
+        """
+        Returns the (latent, incubation, recovery) periods of n infections
+        as an array of shape (n, 3), taken from the pool of pre-sampled
+        disease progressions (which is refilled as needed, and discarded
+        if the periods change).
+
+        For deterministic planners, the shared template is broadcast
+        instead, and nothing is sampled.
+        """
+        if self.is_deterministic():
+            return np.broadcast_to(
+                self.get_disease_progression_template(), (n, 3))
+
+        _pool_key = (
+            self.latent_period_mu, self.latent_period_sigma,
+            self.incubation_period_mu, self.incubation_period_sigma,
+            self.recovery_period_mu, self.recovery_period_sigma)
+        if self._pool_key != _pool_key:
+            self._pool = self._pool[:0]
+            self._pool_index = 0
+            self._pool_key = _pool_key
+
+        if self._pool_index + n > len(self._pool):
+            remaining = self._pool[self._pool_index:]
+            self._pool = np.concatenate([
+                remaining,
+                self.sample_disease_progressions(
+                    max(self.pool_size, n - len(remaining)))
+            ])
+            self._pool_index = 0
+
+        disease_progressions = \
+            self._pool[self._pool_index:self._pool_index + n]
+        self._pool_index += n
+        return disease_progressions
+
     def sample_disease_progression(self):
         """
             Plans out the schedule of the state transitions for a
             particular agent using a particular disease model.
         """
+        latent_period, incubation_period, recovery_period = \
+            self.get_disease_progressions(1)[0].tolist()
+        return latent_period, incubation_period, recovery_period
+
+    def sample_disease_progressions(self, n):
+        """
+            Samples the (latent, incubation, recovery) periods of n
+            infections at once, and returns them as an array of
+            shape (n, 3).
+
+            The periods are drawn from normal distributions (and rounded),
+            and the invalid samples are redrawn until they all meet the
+            conditions below.
+        """
+        def _sample(mu, sigma, lower_bound):
+            """
+            Samples rounded normal periods, which are > lower_bound
+            """
+            lower_bound = np.broadcast_to(lower_bound, (n, ))
+            period = np.rint(self.np_random.normal(mu, sigma, size=n))
+            invalid = period <= lower_bound
+            for _ in range(MAX_REJECTION_ROUNDS):
+                if not invalid.any():
+                    break
+                period[invalid] = np.rint(self.np_random.normal(
+                    mu, sigma, size=invalid.sum()))
+                invalid = period <= lower_bound
+
+            if invalid.any():
+                # The remaining lower bounds are far out in the tail
+                # of the distribution : sample the tail directly
+                if sigma <= 0:
+                    raise Exception(
+                        "Unable to sample a valid disease progression "
+                        "with the provided periods")
+                _lower_bound = np.floor(lower_bound[invalid]) + 1
+                z = sample_standard_normal_tail(
+                    self.np_random, (_lower_bound - 0.5 - mu) / sigma)
+                period[invalid] = np.maximum(
+                    np.rint(mu + sigma * z), _lower_bound)
+            return period.astype(np.int32)
 
         # Case when the patient gets an infection
 
@@ -96,12 +273,8 @@ class SEIRDiseasePlanner(DiseasePlannerBase):
         #  - Latent Period has to be >= 0.
         #############################################
         #############################################
-        latent_period = -1
-        while True:
-            latent_period = round(self.random.normalvariate(
-                self.latent_period_mu, self.latent_period_sigma))
-            if latent_period >= 0:
-                break
+        latent_period = _sample(
+            self.latent_period_mu, self.latent_period_sigma, -1)
 
         #############################################
         #############################################
@@ -112,12 +285,9 @@ class SEIRDiseasePlanner(DiseasePlannerBase):
         #    the latent period.
         #############################################
         #############################################
-        incubation_period = -1
-        while True:
-            incubation_period = round(self.random.normalvariate(
-                self.incubation_period_mu, self.incubation_period_sigma))
-            if incubation_period > latent_period:
-                break
+        incubation_period = _sample(
+            self.incubation_period_mu, self.incubation_period_sigma,
+            latent_period)
 
         #############################################
         #############################################
@@ -128,14 +298,12 @@ class SEIRDiseasePlanner(DiseasePlannerBase):
         #    the Incubation period.
         #############################################
         #############################################
-        recovery_period = -1
-        while True:
-            recovery_period = round(self.random.normalvariate(
-                self.recovery_period_mu, self.recovery_period_sigma))
-            if recovery_period > incubation_period:
-                break
+        recovery_period = _sample(
+            self.recovery_period_mu, self.recovery_period_sigma,
+            incubation_period)
 
-        return latent_period, incubation_period, recovery_period
+        return np.stack(
+            [latent_period, incubation_period, recovery_period], axis=1)
 
     def build_disease_plan(self, disease_progression, base_timestep=0):
         #############################################
@@ -146,7 +314,7 @@ class SEIRDiseasePlanner(DiseasePlannerBase):
         #############################################
         #############################################
         latent_period, incubation_period, recovery_period = \
-            self.sample_disease_progression()
+            disease_progression
         disease_plan = []
 
         # Susceptible -> Exposed | Now
@@ -197,7 +365,9 @@ class SimpleSEIRDiseasePlanner(SEIRDiseasePlanner):
                  latent_period=2 * 1,
                  incubation_period=5 * 1,
                  recovery_period=14 * 1,
-                 random=False
+                 random=False,
+                 np_random=None,
+                 pool_size=1024
                  ):
         self.latent_period_mu = latent_period
         self.latent_period_sigma = 0
@@ -208,10 +378,7 @@ class SimpleSEIRDiseasePlanner(SEIRDiseasePlanner):
         self.recovery_period_mu = recovery_period
         self.recovery_period_sigma = 0
 
-        self.random = random
-        if not self.random:
-            import random
-            self.random = random
+        self.initialize_random(random, np_random, pool_size)
 
 
 if __name__ == "__main__":
@@ -8,14 +8,35 @@ import numpy as np
 
 from rog_rl.agent_state import AgentState
 from rog_rl.model import DiseaseSimModel
+from rog_rl.numpy_model import NumpyDiseaseSimModel
+from rog_rl import observation as observation_utils
 from rog_rl.vaccination_response import VaccinationResponse
 
 
+SIMULATION_ENGINES = {
+    "mesa": DiseaseSimModel,
+    "numpy": NumpyDiseaseSimModel
+}
+
+
 class ActionType(Enum):
     STEP = 0
     VACCINATE = 1
 
 
+# Levels of detail of the info dicts returned by env.step
+INFO_LEVELS = ["none", "minimal", "full"]
+# Keys of the population fractions in the game metrics, by AgentState.value
+POPULATION_METRIC_KEYS = [
+    "population.{}".format(_state.name) for _state in AgentState]
+
+# Ways of choosing the focus cell of the windowed observations
+OBSERVATION_WINDOW_FOCUSES = ["last_vaccination", "infections"]
+# States counted when focusing on the densest infection cluster
+INFECTED_STATES = (
+    AgentState.EXPOSED, AgentState.INFECTIOUS, AgentState.SYMPTOMATIC)
+
+
 class RogSimEnv(gym.Env):
 
     def __init__(self, config={}):
@@ -39,8 +60,59 @@ class RogSimEnv(gym.Env):
                     },
                     max_simulation_timesteps=200,
                     early_stopping_patience=14,
+                    # stop the simulation as soon as there are no exposed,
+                    # infectious or symptomatic agents left (with the
+                    # same metrics as the early stopping)
+                    stop_on_epidemic_end=True,
                     use_renderer=False,  # can be "human", "ansi"
                     toric=True,
+                    engine="mesa",  # can be "mesa", "numpy"
+                    # can be "one_hot", "label_map"
+                    observation_mode="one_hot",
+                    # can be "float32", "float64", "uint8", "bool"
+                    observation_dtype="float32",
+                    # can be "whc", "chw"
+                    observation_layout="whc",
+                    # report the (x, y, old_state, new_state) changes of
+                    # the cells since the previous step in
+                    # info["observation_deltas"]
+                    report_observation_deltas=False,
+                    # report the boolean (width, height) mask of the cells
+                    # where a VACCINATE action can succeed (the cells
+                    # holding susceptible agents) in info["action_mask"]
+                    report_action_mask=False,
+                    # if set, the observations are dicts holding the per
+                    # state counts over k x k tiles ("pooled"), along with
+                    # the full resolution observation of the
+                    # (x, y, width, height) observation_crop ("crop")
+                    # if provided
+                    observation_pooling_tile_size=None,
+                    observation_crop=None,
+                    # if set to (width, height), the observations are the
+                    # width x height windows centred on a focus cell,
+                    # which is the cell of the last VACCINATE action
+                    # ("last_vaccination", the centre of the grid before
+                    # any vaccination), or the centre of the window holding
+                    # the most infected agents ("infections")
+                    observation_window=None,
+                    observation_window_focus="last_vaccination",
+                    # number of simulation ticks run by a STEP action
+                    ticks_per_step=1,
+                    # report the reward components of every step in
+                    # info["tick_rewards"] (one per tick run by STEP
+                    # actions, a single one for the other actions)
+                    report_tick_rewards=False,
+                    # level of detail of the info returned by env.step :
+                    # "full" (the game metrics), "minimal" (the per state
+                    # agent counts only), "none" (only the keys
+                    # requested above, like observation_deltas)
+                    info_level="full",
+                    # skip the validation (and conversion) of the actions
+                    # passed to env.step, when they are known to be valid
+                    trusted_actions=False,
+                    # restart the simulation in place on env.reset, reusing
+                    # all its allocations, instead of building a new one
+                    in_place_reset=True,
                     dummy_simulation=False,
                     debug=False)
         self.config = {}
@@ -50,22 +122,52 @@ class RogSimEnv(gym.Env):
         self.dummy_simulation = self.config["dummy_simulation"]
         self.debug = self.config["debug"]
 
+        if self.config["info_level"] not in INFO_LEVELS:
+            raise Exception(
+                "Unknown info level : {}. Expected one of : {}".format(
+                    self.config["info_level"], INFO_LEVELS))
+        self.info_level = self.config["info_level"]
+        self.trusted_actions = self.config["trusted_actions"]
+
+        self.ticks_per_step = self.config["ticks_per_step"]
+        assert self.ticks_per_step >= 1, \
+            "ticks_per_step should be a positive integer"
+        # Per state agent counts after every tick of a STEP action
+        self._tick_state_counts = None
+        if self.config["report_tick_rewards"]:
+            self._tick_state_counts = np.zeros(
+                (self.ticks_per_step, len(AgentState)), dtype=np.int64)
+
         self.width = self.config["width"]
         self.height = self.config["height"]
 
         self.use_renderer = self.config["use_renderer"]
 
+        if self.config["engine"] not in SIMULATION_ENGINES:
+            raise Exception(
+                "Unknown simulation engine : {}. Expected one of : {}".format(
+                    self.config["engine"], list(SIMULATION_ENGINES.keys())))
+        self.simulation_engine = SIMULATION_ENGINES[self.config["engine"]]
+
+        if self.config["observation_window"]:
+            if self.config["observation_window_focus"] not in \
+                    OBSERVATION_WINDOW_FOCUSES:
+                raise Exception(
+                    "Unknown observation window focus : {}. "
+                    "Expected one of : {}".format(
+                        self.config["observation_window_focus"],
+                        OBSERVATION_WINDOW_FOCUSES))
+            if self.config["observation_pooling_tile_size"]:
+                raise Exception(
+                    "observation_window and observation_pooling_tile_size "
+                    "can not be used together")
+        self.focus_cell = (self.width // 2, self.height // 2)
+
         self.action_space = spaces.MultiDiscrete(
             [
                 len(ActionType), self.width, self.height
             ])
-        self.observation_space = spaces.Box(
-                                    low=np.float32(0),
-                                    high=np.float32(1),
-                                    shape=(
-                                        self.width,
-                                        self.height,
-                                        len(AgentState)))
+        self.observation_space = self.build_observation_space()
 
         self._model = None
         self.running_score = None
@@ -78,22 +180,125 @@ class RogSimEnv(gym.Env):
 
         self.cumulative_reward = 0
 
+    def build_observation_space(self):
+        """
+        Returns the observation space matching the observation config
+        """
+        observation_config = dict(
+            observation_mode=self.config["observation_mode"],
+            observation_dtype=self.config["observation_dtype"],
+            observation_layout=self.config["observation_layout"])
+        if self.config["observation_window"]:
+            return observation_utils.build_observation_space(
+                *self.config["observation_window"], **observation_config)
+
+        tile_size = self.config["observation_pooling_tile_size"]
+        if not tile_size:
+            return observation_utils.build_observation_space(
+                self.width, self.height, **observation_config)
+
+        tiles_shape = (
+            (self.width + tile_size - 1) // tile_size,
+            (self.height + tile_size - 1) // tile_size)
+        _spaces = {
+            "pooled": spaces.Box(
+                low=0,
+                high=tile_size * tile_size,
+                shape=observation_utils.get_observation_shape(
+                    tiles_shape, "one_hot",
+                    self.config["observation_layout"]),
+                dtype=np.int32)
+        }
+        if self.config["observation_crop"]:
+            _, _, crop_width, crop_height = self.config["observation_crop"]
+            _spaces["crop"] = observation_utils.build_observation_space(
+                crop_width, crop_height, **observation_config)
+        return spaces.Dict(_spaces)
+
+    def get_observation(self, out=None):
+        """
+        Returns the current observation as per the observation config.
+
+        If a preallocated `out` array (or dict of arrays for the pooled
+        observations) is provided, the observation is written into it,
+        and `out` is returned.
+        """
+        if self.config["observation_window"]:
+            return self._model.get_observation_window(
+                *self.get_focus_cell(), *self.config["observation_window"],
+                out=out)
+
+        if not self.config["observation_pooling_tile_size"]:
+            return self._model.get_observation(out=out)
+
+        if out is None:
+            out = {}
+        observation = {
+            "pooled": self._model.get_pooled_observation(
+                out=out.get("pooled"))
+        }
+        if self.config["observation_crop"]:
+            observation["crop"] = self._model.get_observation_crop(
+                *self.config["observation_crop"], out=out.get("crop"))
+        return observation
+
+    def get_focus_cell(self):
+        """
+        Returns the (x, y) cell the windowed observations are centred on
+
+        With the "infections" focus, it falls back to the cell of the last
+        VACCINATE action (as with "last_vaccination") when there are no
+        infected agents left
+        """
+        if self.config["observation_window_focus"] == "infections":
+            focus_cell = self._model.find_densest_window(
+                *self.config["observation_window"], INFECTED_STATES)
+            if focus_cell is not None:
+                return focus_cell
+        return self.focus_cell
+
+    def get_action_mask(self, out=None):
+        """
+        Returns the boolean (width, height) mask of the cells where
+        a VACCINATE action can succeed, i.e. the cells holding
+        susceptible agents (a VACCINATE action on any other cell wastes
+        a vaccine).
+
+        The mask is maintained by the simulation along with the
+        observation, so it is never recomputed from the whole grid.
+        When a preallocated `out` array is provided, the mask is copied
+        into it, else the live mask of the simulation is returned.
+        """
+        if self._model is None:
+            raise Exception(
+                "env.get_action_mask() called before calling env.reset()")
+        return self._model.get_susceptible_mask(out=out)
+
     def set_renderer(self, renderer):
         self.use_renderer = renderer
         if self.use_renderer:
             self.initialize_renderer(mode=self.use_renderer)
 
-    def reset(self):
-        # Delete Model if already exists
-        if self._model:
-            del self._model
+    def reset(self, out=None):
+        """
+        Resets the environment, and returns the first observation.
+
+        If a preallocated `out` array is provided, the observation is
+        written into it (and `out` is returned), else the live observation
+        buffer of the simulation is returned.
+        """
+        # Delete Model if already exists (unless it is reset in place)
+        if self._model is not None and \
+                (self.dummy_simulation or not self.config['in_place_reset']):
+            self._model = None
 
         if self.dummy_simulation:
             """
             In dummy simulation mode
             return a randomly sampled observation
             """
-            return self.observation_space.sample()
+            return self._copy_observation(
+                self.observation_space.sample(), out)
 
         width = self.config['width']
         height = self.config['height']
@@ -118,35 +323,62 @@ class RogSimEnv(gym.Env):
             whenever env.seed() is called, the said np_random instance
             is seeded
 
-            and during every new instantiation of a DiseaseEngine instance,
-            it is seeded with a random number sampled from the self.np_random.
+            and during every new instantiation (or in place reset) of
+            a DiseaseEngine instance, it is seeded with a random number
+            sampled from the self.np_random.
         """
         _simulator_instance_seed = self.np_random.rand()
-        # Instantiate Disease Model
-        self._model = DiseaseSimModel(
-            width, height,
-            population_density, vaccine_density,
-            initial_infection_fraction, initial_vaccination_fraction,
-            prob_infection, prob_agent_movement,
-            disease_planner_config,
-            max_simulation_timesteps, early_stopping_patience,
-            toric, seed=_simulator_instance_seed
-        )
+        if self._model is not None:
+            # Restart the existing Disease Model in place
+            self._model.reset(seed=_simulator_instance_seed)
+        else:
+            # Instantiate Disease Model
+            self._model = self.simulation_engine(
+                width, height,
+                population_density, vaccine_density,
+                initial_infection_fraction, initial_vaccination_fraction,
+                prob_infection, prob_agent_movement,
+                disease_planner_config,
+                max_simulation_timesteps, early_stopping_patience,
+                toric, seed=_simulator_instance_seed,
+                observation_mode=self.config['observation_mode'],
+                observation_dtype=self.config['observation_dtype'],
+                observation_layout=self.config['observation_layout'],
+                pooling_tile_size=self.config[
+                    'observation_pooling_tile_size'],
+                stop_on_epidemic_end=self.config['stop_on_epidemic_end']
+            )
 
         # Set the max timesteps of an env as the sum of :
-        # - max_simulation_timesteps
+        # - Number of STEP actions needed for max_simulation_timesteps
         # - Number of Vaccines available
 
-        self._max_episode_steps = self.config['max_simulation_timesteps'] + \
-            self._model.n_vaccines
+        self._max_episode_steps = -(
+            -self.config['max_simulation_timesteps'] // self.ticks_per_step
+        ) + self._model.n_vaccines
+
+        self.focus_cell = (self.width // 2, self.height // 2)
 
         # Tick model
         self._model.tick()
 
+        if self.config['report_observation_deltas']:
+            self._model.enable_change_log()
+
         self.running_score = self.get_current_game_score()
         self.cumulative_reward = 0
         # return observation
-        return self._model.get_observation()
+        return self.get_observation(out=out)
+
+    def _copy_observation(self, observation, out):
+        if out is None:
+            return observation
+        if isinstance(observation, dict):
+            for _key in observation.keys():
+                np.copyto(out[_key], observation[_key])
+        else:
+            np.copyto(out, observation)
+        return out
 
     def initialize_renderer(self, mode="human"):
         if mode in ["human", "rgb_array"]:
@@ -174,8 +406,9 @@ class RogSimEnv(gym.Env):
         # Draw Renderer
         # Update Renderer State
         model = self._model
-        scheduler = model.get_scheduler()
-        total_agents = scheduler.get_agent_count()
+        total_agents = model.n_agents
+        # (width, height, num_states) view of the observation
+        observation = model.observation
         state_metrics = self.get_current_game_metrics()
 
         initial_vaccines = int(
@@ -184,7 +417,7 @@ class RogSimEnv(gym.Env):
         _vaccines_given = \
             model.max_vaccines - model.n_vaccines - initial_vaccines
 
-        _simulation_steps = int(scheduler.steps)
+        _simulation_steps = int(model.get_timestep())
 
         # Game Steps includes steps in which each agent is vaccinated
         _game_steps = _simulation_steps + _vaccines_given
@@ -210,9 +443,9 @@ class RogSimEnv(gym.Env):
             )
             if mode in ["human", "rgb_array"]:
                 color = self.renderer.COLOR_MAP.get_color(_state)
-                agents = scheduler.get_agents_by_state(_state)
-                for _agent in agents:
-                    _agent_x, _agent_y = _agent.pos
+                cells = np.argwhere(
+                    observation_utils.get_state_mask(observation, _state))
+                for _agent_x, _agent_y in cells:
                     self.renderer.draw_cell(
                                 _agent_x, _agent_y,
                                 color
@@ -250,67 +483,128 @@ class RogSimEnv(gym.Env):
         """
         Returns a dictionary containing important game metrics
         """
-        _d = {}
         # current population fraction of different states
-        for _state in AgentState:
-            if not dummy_simulation:
-                _value = self._model.get_population_fraction_by_state(_state)
-            else:
-                _value = self.np_random.rand()
-
-            _key = "population.{}".format(_state.name)
-            _d[_key] = _value
+        if not dummy_simulation:
+            fractions = (
+                self._model.get_state_counts() / self._model.n_agents
+            ).tolist()
+        else:
+            fractions = self.np_random.rand(len(AgentState)).tolist()
+        _d = dict(zip(POPULATION_METRIC_KEYS, fractions))
         # Add R0 to the game metrics
         _d["R0/10"] = self._model.contact_network.compute_R0()/10.0
         return _d
 
-    def step(self, action):
+    def step(self, action, out=None):
+        """
+        Executes an action, and returns (observation, reward, done, info)
+
+        If a preallocated `out` array is provided, the observation is
+        written into it (and returned), else the live observation
+        buffer of the simulation is returned.
+        """
         # Handle dummy_simulation Mode
         if self.dummy_simulation:
-            return self.dummy_env_step()
+            observation, reward, done, info = self.dummy_env_step()
+            return self._copy_observation(observation, out), \
+                reward, done, info
 
-        assert self.action_space.contains(
-            action), "%r (%s) invalid" % (action, type(action))
         if self._model is None:
             raise Exception("env.step() called before calling env.reset()")
-
-        action = [int(x) for x in action]
-        if self.debug:
-            print("Action : ", action)
-
         # Handle action propagation in real simulator
-        action_type = action[0]
-        cell_x = action[1]
-        cell_y = action[2]
+        if self.trusted_actions:
+            action_type, cell_x, cell_y = action
+        else:
+            assert self.action_space.contains(
+                action), "%r (%s) invalid" % (action, type(action))
+            action_type, cell_x, cell_y = [int(x) for x in action]
+        if self.debug:
+            print("Action : ", [action_type, cell_x, cell_y])
 
-        _observation = False
-        _done = False
         _info = {}
         if action_type == ActionType.STEP.value:
-            self._model.tick()
-            _observation = self._model.get_observation()
+            n_ticks = self._model.tick_many(
+                self.ticks_per_step, state_counts=self._tick_state_counts)
+            if self._tick_state_counts is not None:
+                _info["tick_rewards"] = np.diff(
+                    self._tick_state_counts[
+                        :n_ticks, AgentState.SUSCEPTIBLE.value] /
+                    self._model.n_agents,
+                    prepend=self.running_score)
         elif action_type == ActionType.VACCINATE.value:
+            self.focus_cell = (cell_x, cell_y)
             vaccination_success, response = \
                 self._model.vaccinate_cell(cell_x, cell_y)
-            _observation = self._model.get_observation()
 
             # Force Run simulation to completion if
             # run out of vaccines
             if response == VaccinationResponse.AGENT_VACCINES_EXHAUSTED:
-                while self._model.is_running():
-                    self._model.tick()
-                    _observation = self._model.get_observation()
+                self._model.run_to_completion()
+        return self._get_step_result(_info, out)
+
+    def vaccinate_cells(self, cells, tick=False, out=None):
+        """
+        Vaccinates a batch of cells in a single env step, and returns
+        (observation, reward, done, info) as env.step
+
+        `cells` is an array of shape (n, 2) of the (x, y) cells to
+        vaccinate, in order, with one vaccine used per cell (as n
+        consecutive VACCINATE actions). The VaccinationResponse.value of
+        every cell is returned in info["vaccination_responses"].
+        If `tick` is True, the simulation is then advanced by one tick.
+        """
+        if self._model is None:
+            raise Exception(
+                "env.vaccinate_cells() called before calling env.reset()")
+        cells = np.asarray(cells, dtype=np.int64).reshape(-1, 2)
+        if not self.trusted_actions:
+            grid_shape = (self.width, self.height)
+            assert ((cells >= 0) & (cells < grid_shape)).all(), \
+                "%r invalid" % (cells, )
+
+        responses = self._model.vaccinate_cells(cells[:, 0], cells[:, 1])
+        if len(cells) > 0:
+            self.focus_cell = tuple(int(_v) for _v in cells[-1])
+
+        if (responses ==
+                VaccinationResponse.AGENT_VACCINES_EXHAUSTED.value).any():
+            # Force Run simulation to completion if
+            # run out of vaccines
+            self._model.run_to_completion()
+        elif tick:
+            self._model.tick()
+
+        return self._get_step_result(
+            {"vaccination_responses": responses}, out)
+
+    def _get_step_result(self, _info, out=None):
+        """
+        Returns the (observation, reward, done, info) of the step which
+        just happened, adding the configured keys to `_info`
+        """
+        _observation = self.get_observation(out=out)
 
         # Compute difference in game score
         current_score = self.get_current_game_score()
         _step_reward = current_score - self.running_score
         self.cumulative_reward += _step_reward
         self.running_score = current_score
+        if self.config['report_tick_rewards'] and \
+                "tick_rewards" not in _info:
+            _info["tick_rewards"] = np.array([_step_reward])
 
         # Add custom game metrics to info key
-        game_metrics = self.get_current_game_metrics()
-        for _key in game_metrics.keys():
-            _info[_key] = game_metrics[_key]
+        if self.info_level == "full":
+            _info.update(self.get_current_game_metrics())
+        elif self.info_level == "minimal":
+            _info["state_counts"] = self._model.get_state_counts().copy()
+
+        if self.config['report_observation_deltas']:
+            _info["observation_deltas"] = \
+                self._model.get_observation_deltas()
+        if self.config['report_action_mask']:
+            _info["action_mask"] = \
+                self._model.get_susceptible_mask().copy()
 
         _done = not self._model.is_running()
         return _observation, _step_reward, _done, _info
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+"""
+Whole-array helpers for working with cell arrays laid out on the grid.
+
+All the helpers operate on the trailing two axes of the arrays they are
+given, which are assumed to be (width, height).
+"""
+import numpy as np
+
+# (dx, dy) offsets of the Moore neighbourhood of a cell
+MOORE_OFFSETS = (
+    (-1, -1), (-1, 0), (-1, 1),
+    (0, -1),           (0, 1),
+    (1, -1),  (1, 0),  (1, 1)
+)
+
+
+def shift(array, dx, dy, toric=True, fill_value=0):
+    """
+    Returns an array where every cell (x, y) holds the value of
+    the cell (x + dx, y + dy) of the provided array.
+
+    On non-toric grids, the cells which would have to be read from
+    outside the grid are filled with `fill_value`
+    """
+    if toric:
+        return np.roll(array, shift=(-dx, -dy), axis=(-2, -1))
+
+    width, height = array.shape[-2:]
+    shifted = np.full_like(array, fill_value)
+    src_x = slice(max(dx, 0), width + min(dx, 0))
+    dst_x = slice(max(-dx, 0), width + min(-dx, 0))
+    src_y = slice(max(dy, 0), height + min(dy, 0))
+    dst_y = slice(max(-dy, 0), height + min(-dy, 0))
+    shifted[..., dst_x, dst_y] = array[..., src_x, src_y]
+    return shifted
+
+
+def neighbour_stack(mask, toric=True):
+    """
+    Returns a boolean array of shape (8, *mask.shape), where the entry
+    [k, ..., x, y] tells if the k-th Moore neighbour of (x, y) is
+    marked in the provided mask
+    """
+    return np.stack([
+        shift(mask, dx, dy, toric=toric, fill_value=False)
+        for dx, dy in MOORE_OFFSETS
+    ])
+
+
+def count_neighbours(mask, toric=True):
+    """
+    Returns the number of marked Moore neighbours for every cell
+    """
+    counts = np.zeros(mask.shape, dtype=np.int8)
+    _mask = mask.astype(np.int8)
+    for dx, dy in MOORE_OFFSETS:
+        counts += shift(_mask, dx, dy, toric=toric, fill_value=0)
+    return counts
+
+
+def choose_neighbours(candidates, np_random):
+    """
+    Given a boolean array of shape (8, n) marking the valid neighbours
+    of n cells, picks one of the valid neighbours for every cell uniformly
+    at random.
+
+    Returns the index of the chosen offset in MOORE_OFFSETS for every cell,
+    and -1 for the cells which do not have any valid neighbour.
+    """
+    n_candidates = candidates.sum(axis=0)
+    choice = np.floor(
+        np_random.random(n_candidates.shape) * n_candidates)
+    chosen = np.argmax(np.cumsum(candidates, axis=0) > choice, axis=0)
+    chosen[n_candidates == 0] = -1
+    return chosen
+
+
+def neighbour_cells(cells, offsets, shape):
+    """
+    Returns the index arrays of the neighbours of the provided cells
+    (an index tuple, whose last two arrays are the x and y coordinates)
+    at the provided (dx, dy) offsets, wrapping around the grid edges
+    """
+    width, height = shape[-2:]
+    *leading, xs, ys = cells
+    return tuple(leading) + (
+        (xs + offsets[:, 0]) % width,
+        (ys + offsets[:, 1]) % height
+    )
+
+
+def moore_neighbours(xs, ys, shape, toric=True):
+    """
+    Returns the coordinates of the Moore neighbours of the provided cells,
+    as (nx, ny, inside) arrays of shape (8, n), where the k-th row holds
+    the neighbours at the k-th offset of MOORE_OFFSETS.
+
+    On toric grids the coordinates wrap around the grid edges, else
+    `inside` marks the neighbours which actually lie on the grid (and the
+    coordinates of the rest of them are clipped to the grid edges).
+    """
+    width, height = shape[-2:]
+    offsets = np.array(MOORE_OFFSETS)
+    nx = np.asarray(xs)[np.newaxis, :] + offsets[:, 0:1]
+    ny = np.asarray(ys)[np.newaxis, :] + offsets[:, 1:2]
+    if toric:
+        return nx % width, ny % height, np.ones(nx.shape, dtype=bool)
+    inside = (nx >= 0) & (nx < width) & (ny >= 0) & (ny < height)
+    return np.clip(nx, 0, width - 1), np.clip(ny, 0, height - 1), inside
+
+
+def resolve_moves(occupied, movers, toric, np_random):
+    """
+    Decides the moves of a batch of agents at once.
+
+    Every mover (an index tuple into `occupied`) picks one of the empty
+    cells in its Moore neighbourhood uniformly at random. When many movers
+    pick the same empty cell, a single one of them (chosen at random) is
+    allowed to move there, and the rest of them stay in place.
+
+    Returns the (source, destination) index tuples of the accepted moves.
+    """
+    empty_neighbours = neighbour_stack(~occupied, toric=toric)
+    chosen = choose_neighbours(
+        empty_neighbours[(slice(None), ) + tuple(movers)], np_random)
+
+    can_move = chosen >= 0
+    sources = tuple(_index[can_move] for _index in movers)
+    targets = neighbour_cells(
+        sources, np.array(MOORE_OFFSETS)[chosen[can_move]], occupied.shape)
+
+    # Resolve conflicts between movers which picked the same target
+    priority = np_random.permutation(len(sources[0]))
+    _, winners = np.unique(
+        np.ravel_multi_index(targets, occupied.shape)[priority],
+        return_index=True)
+    winners = priority[winners]
+
+    return tuple(_index[winners] for _index in sources), \
+        tuple(_index[winners] for _index in targets)
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+import numpy as np
+
+from rog_rl.agent_state import AgentState
+
+
+class MetricsRecorder:
+    """
+    Records the per-state population fractions and the R0 of a
+    DiseaseSimModel at every timestep.
+
+    It is a drop-in replacement for the mesa DataCollector the model used
+    to rely on :
+        - the running per-state counts are read from the model (which
+          keeps them up to date on every state change) instead of being
+          recomputed by a set of reporters
+        - the records are appended to preallocated numpy arrays sized by
+          max_timesteps (which are used as a ring buffer if the model is
+          ticked beyond that)
+        - the length of the current run of unchanged susceptible counts
+          is maintained on every record, so that the early stopping check
+          is answered in constant time
+        - the pandas DataFrame is only built on demand
+
+    `model_vars` is still exposed as a mapping of
+    metric name => chronological array of values, so that the mesa
+    ChartModule keeps working with the recorder.
+    """
+    STATE_METRICS = [
+        ("Susceptible", AgentState.SUSCEPTIBLE),
+        ("Exposed", AgentState.EXPOSED),
+        ("Infectious", AgentState.INFECTIOUS),
+        ("Symptomatic", AgentState.SYMPTOMATIC),
+        ("Recovered", AgentState.RECOVERED),
+        ("Vaccinated", AgentState.VACCINATED),
+    ]
+    R0_METRIC = "R0/10"
+
+    def __init__(self, capacity):
+        assert capacity > 0, "capacity should be a positive integer"
+        self.capacity = capacity
+        self.state_counts = np.zeros(
+            (capacity, len(AgentState)), dtype=np.int64)
+        self.r0 = np.zeros(capacity, dtype=np.float64)
+        self.n_agents = 1
+
+        self.n_records = 0
+        self.susceptible_streak = 0
+
+    def reset(self):
+        """
+        Forgets all the records (the preallocated arrays are reused)
+        """
+        self.n_records = 0
+        self.susceptible_streak = 0
+
+    ###########################################################################
+    # Recording
+    ###########################################################################
+    def collect(self, model):
+        """
+        Records the current state counts and R0 of the provided model
+        """
+        self.n_agents = max(model.n_agents, 1)
+        self.record(
+            model.get_state_counts(),
+            model.contact_network.compute_R0())
+
+    def record(self, state_counts, r0):
+        """
+        Appends a single record
+        """
+        self.susceptible_streak = self.get_susceptible_streak_after(
+            state_counts[AgentState.SUSCEPTIBLE.value], 1)
+
+        _index = self.n_records % self.capacity
+        self.state_counts[_index] = state_counts
+        self.r0[_index] = r0
+        self.n_records += 1
+
+    def record_repeated(self, state_counts, r0, n_records):
+        """
+        Appends n_records identical records at once
+        """
+        if n_records <= 0:
+            return
+        self.susceptible_streak = self.get_susceptible_streak_after(
+            state_counts[AgentState.SUSCEPTIBLE.value], n_records)
+
+        # Only the last `capacity` records are kept
+        _indices = np.arange(
+            self.n_records + max(n_records - self.capacity, 0),
+            self.n_records + n_records) % self.capacity
+        self.state_counts[_indices] = state_counts
+        self.r0[_indices] = r0
+        self.n_records += n_records
+
+    ###########################################################################
+    # Queries
+    ###########################################################################
+    def _index(self, offset):
+        return (self.n_records + offset) % self.capacity
+
+    def __len__(self):
+        return min(self.n_records, self.capacity)
+
+    def get_susceptible_streak_after(self, susceptible_count, n_records):
+        """
+        Returns the length of the run of unchanged susceptible counts
+        after recording `susceptible_count` n_records more times
+        """
+        if self.n_records > 0 and susceptible_count == \
+                self.state_counts[self._index(-1), AgentState.SUSCEPTIBLE.value]:  # noqa
+            return self.susceptible_streak + n_records
+        return n_records
+
+    def is_susceptible_population_stagnant(self, patience):
+        """
+        Returns True if the last `patience` recorded susceptible counts
+        are all equal
+        """
+        if patience <= 0:
+            # Mirrors the semantics of slicing the last 0 records
+            # (which returns all the records)
+            patience = self.n_records
+        return self.susceptible_streak >= patience
+
+    def _chronological(self, array):
+        if self.n_records <= self.capacity:
+            return array[:self.n_records]
+        _start = self.n_records % self.capacity
+        return np.concatenate([array[_start:], array[:_start]])
+
+    def get_state_counts(self):
+        """
+        Returns the recorded state counts as an array of shape
+        (n_records, num_states)
+        """
+        return self._chronological(self.state_counts)
+
+    @property
+    def model_vars(self):
+        fractions = self.get_state_counts() / self.n_agents
+        _model_vars = {
+            _name: fractions[:, _state.value]
+            for _name, _state in self.STATE_METRICS
+        }
+        _model_vars[self.R0_METRIC] = self._chronological(self.r0) / 10.0
+        return _model_vars
+
+    def get_model_vars_dataframe(self):
+        """
+        Returns the recorded metrics as a pandas DataFrame
+        """
+        import pandas as pd
+        return pd.DataFrame(self.model_vars)
@@ -1,15 +1,32 @@
 from mesa import Model
-from mesa.space import SingleGrid
-from mesa.datacollection import DataCollector
 
 import numpy as np
 
 from rog_rl.agent import DiseaseSimAgent
+from rog_rl.agent_store import AgentStore, AgentGridView, NO_AGENT, \
+    NO_TRANSITION
+from rog_rl import grid_ops
+from rog_rl.grid_ops import MOORE_OFFSETS
+from rog_rl import observation as observation_utils
 from rog_rl.disease_planner import SEIRDiseasePlanner
 from rog_rl.scheduler import CustomScheduler
 from rog_rl.agent_state import AgentState
 from rog_rl.vaccination_response import VaccinationResponse
 from rog_rl.contact_network import ContactNetwork
+from rog_rl.metrics_recorder import MetricsRecorder
+from rog_rl.change_log import ChangeLog
+
+# VaccinationResponse.value of the vaccination of a cell, indexed by
+# the AgentState.value of its agent + 1 (0 for the empty cells)
+VACCINATION_RESPONSES_BY_STATE = np.array([
+    VaccinationResponse.CELL_EMPTY.value,
+    VaccinationResponse.VACCINATION_SUCCESS.value,
+    VaccinationResponse.AGENT_EXPOSED.value,
+    VaccinationResponse.AGENT_INFECTIOUS.value,
+    VaccinationResponse.AGENT_SYMPTOMATIC.value,
+    VaccinationResponse.AGENT_RECOVERED.value,
+    VaccinationResponse.AGENT_VACCINATED.value,
+], dtype=np.int8)
 
 
 class DiseaseSimModel(Model):
@@ -24,6 +41,10 @@ class DiseaseSimModel(Model):
 
     The scheduler is a special model component which controls the order
     in which agents are activated.
+
+    The state of all the agents is held in an AgentStore (as contiguous
+    typed arrays), and DiseaseSimAgent objects are only created as
+    lightweight views where needed (for instance by the visualizations).
     """
 
     def __init__(
@@ -47,9 +68,17 @@ class DiseaseSimModel(Model):
         max_timesteps=200,
         early_stopping_patience=14,
         toric=True,
-        seed=None
+        seed=None,
+        observation_mode="one_hot",
+        observation_dtype="float32",
+        observation_layout="whc",
+        pooling_tile_size=None,
+        stop_on_epidemic_end=True
     ):
         super().__init__()
+        # numpy random number generator, for the vectorized sampling,
+        # seeded from the (seeded) random number generator of the model
+        self.np_random = np.random.default_rng(self.random.getrandbits(64))
 
         self.width = width
         self.height = height
@@ -72,16 +101,33 @@ class DiseaseSimModel(Model):
         self.early_stopping_patience = early_stopping_patience
         self.toric = toric
         self.seed = seed
+        self.observation_mode = observation_mode
+        self.observation_dtype = observation_dtype
+        self.observation_layout = observation_layout
+        self.pooling_tile_size = pooling_tile_size
+        self.stop_on_epidemic_end = stop_on_epidemic_end
+
+        self.change_log = None
+        # Set while the observation maintenance is suspended
+        # (see suspend_observation)
+        self.observation_suspended = False
+        # Incremented on every update of the observation, to know when
+        # the cached integral image has to be rebuilt
+        self.observation_version = 0
+        self._integral_image = None
+        self._integral_image_version = -1
+
+        self.agent_store = None
 
         self.initialize_observation()
         self.initialize_disease_planner()
         self.initialize_scheduler()
         self.initialize_grid()
-        self.initialize_contact_network()
         self.initialize_agents(
             infection_fraction=self.initial_infection_fraction,
             vaccination_fraction=self.initial_vaccination_fraction
         )
+        self.initialize_contact_network()
         self.initialize_datacollector()
         self.running = True
         self.datacollector.collect(self)
@@ -94,9 +140,36 @@ class DiseaseSimModel(Model):
         """
         Observation is a nd-array of shape (width, height, num_states)
         where each AgentState will be marked in a separate challenge
-        for each of the cells
+        for each of the cells (of type observation_dtype)
+
+        In the "label_map" observation_mode, it is instead a single channel
+        int8 array of shape (width, height) holding the AgentState.value
+        of every cell (or -1 for the empty cells)
+
+        The observation buffer is allocated in the observation_layout
+        ("whc" or "chw"), and the model writes to it through
+        the (width, height, num_states) `observation` view
         """
-        self.observation = np.zeros((self.width, self.height, len(AgentState)))
+        self.observation_buffer = observation_utils.allocate_observation(
+            (self.width, self.height),
+            observation_mode=self.observation_mode,
+            observation_dtype=self.observation_dtype,
+            observation_layout=self.observation_layout)
+        self.observation = observation_utils.grid_view(
+            self.observation_buffer, self.observation_layout)
+
+        # Per state counts over pooling_tile_size x pooling_tile_size tiles
+        # (if enabled), maintained along with the observation
+        self.tile_counts = None
+        if self.pooling_tile_size:
+            self.tile_counts = observation_utils.TileCounts(
+                self.width, self.height, self.pooling_tile_size,
+                observation_layout=self.observation_layout)
+
+        # Cells holding susceptible agents (the only cells where
+        # a vaccination can succeed), maintained along with the observation
+        self.susceptible_mask = np.zeros(
+            (self.width, self.height), dtype=bool)
 
     def initialize_disease_planner(self):
         """
@@ -109,7 +182,9 @@ class DiseaseSimModel(Model):
             incubation_period_mu=self.disease_planner_config["incubation_period_mu"],  # noqa
             incubation_period_sigma=self.disease_planner_config["incubation_period_sigma"],  # noqa
             recovery_period_mu=self.disease_planner_config["recovery_period_mu"],  # noqa
-            recovery_period_sigma=self.disease_planner_config["recovery_period_sigma"]  # noqa
+            recovery_period_sigma=self.disease_planner_config["recovery_period_sigma"],  # noqa
+            random=self.random,
+            np_random=self.np_random
         )
 
     def initialize_scheduler(self):
@@ -121,15 +196,17 @@ class DiseaseSimModel(Model):
     def initialize_grid(self):
         """
         Initializes the initial Grid
+
+        The grid cells themselves are held in the AgentStore, the grid
+        object is only a view providing a mesa-like Grid API on top of it
         """
-        self.grid = SingleGrid(
-            width=self.width, height=self.height, torus=self.toric)
+        self.grid = AgentGridView(self)
 
     def initialize_contact_network(self):
         """
         Initializes the contact network
         """
-        self.contact_network = ContactNetwork()
+        self.contact_network = ContactNetwork(self.n_agents)
 
     def initialize_agents(self, infection_fraction, vaccination_fraction):
         """
@@ -153,48 +230,103 @@ class DiseaseSimModel(Model):
         # available in the whole simulation
         self.max_vaccines = self.n_vaccines + number_of_agents_to_vaccinate
 
-        for i in range(self.n_agents):
-            agent = DiseaseSimAgent(
-                unique_id=i,
-                model=self,
-                prob_agent_movement=self.prob_agent_movement
-            )
-            self.schedule.add(agent)
-            self.grid.position_agent(agent, x="random", y="random")
-
-            # Update model observation
-            # TODO- This has to be refactored to avoid repitition
-            agent_x, agent_y = agent.pos
-            self.observation[agent_x, agent_y, agent.state.value] = 1
-
-            # Seed the infection in a fraction of the agents
-            infection_condition = i < number_of_agents_to_infect
-            if infection_condition:
-                agent.trigger_infection(prob_infection=1.0)
-
-            # Seed the vaccination in a fraction of the agents
-            vaccination_condition = (
-                i >= number_of_agents_to_infect and
-                i < (number_of_agents_to_infect + number_of_agents_to_vaccinate))  # noqa
-
-            if vaccination_condition:
-                agent.set_state(AgentState.VACCINATED)
+        if self.agent_store is None:
+            self.agent_store = AgentStore(
+                self.n_agents, self.width, self.height, toric=self.toric)
+
+        # Position all the agents at random (distinct) cells
+        cells = self.np_random.choice(
+            self.width * self.height, size=self.n_agents, replace=False)
+        xs, ys = np.unravel_index(cells, (self.width, self.height))
+        agent_ids = np.arange(self.n_agents)
+        self.agent_store.place(agent_ids, xs, ys)
+
+        # Update model observation
+        self.update_observation(xs, ys)
+
+        # Seed the infection in a fraction of the agents
+        self.trigger_infections(agent_ids[:number_of_agents_to_infect])
+
+        # Seed the vaccination in a fraction of the agents
+        vaccinated_ids = agent_ids[
+            number_of_agents_to_infect:
+            number_of_agents_to_infect + number_of_agents_to_vaccinate]
+        self.set_agents_state(
+            vaccinated_ids,
+            np.full(len(vaccinated_ids), AgentState.VACCINATED.value))
 
     def initialize_datacollector(self):
         """
         Setup the initial datacollector
+
+        The per state population fractions and R0 are recorded in
+        a MetricsRecorder, preallocated for the initial record and one
+        record per timestep
         """
-        self.datacollector = DataCollector(
-            model_reporters={
-                "Susceptible": lambda m: m.get_population_fraction_by_state(AgentState.SUSCEPTIBLE),  # noqa
-                "Exposed": lambda m: m.get_population_fraction_by_state(AgentState.EXPOSED),  # noqa
-                "Infectious": lambda m: m.get_population_fraction_by_state(AgentState.INFECTIOUS),  # noqa
-                "Symptomatic": lambda m: m.get_population_fraction_by_state(AgentState.SYMPTOMATIC),  # noqa
-                "Recovered": lambda m: m.get_population_fraction_by_state(AgentState.RECOVERED),  # noqa
-                "Vaccinated": lambda m: m.get_population_fraction_by_state(AgentState.VACCINATED),  # noqa
-                "R0/10": lambda m: m.contact_network.compute_R0()/10.0
-            }
+        self.datacollector = MetricsRecorder(
+            capacity=self.max_timesteps + 1)
+
+    ###########################################################################
+    ###########################################################################
+    # In Place Reset
+    #       - Functions for restarting the simulation while reusing
+    #         all the allocations of the model
+    ###########################################################################
+
+    def reset(self, seed=None):
+        """
+        Restarts the simulation in place, with the same parameters
+
+        The resulting simulation is the same as the one of a new model
+        constructed with the provided seed, but the existing arrays
+        (agents, grid, observation, contact network, metrics, etc) are
+        cleared and reused instead of being reallocated.
+        If no seed is provided, a new one is drawn from the random number
+        generator of the model.
+        """
+        if seed is None:
+            seed = self.random.getrandbits(64)
+        self.seed = seed
+        self.reset_randomizer(seed)
+        self.np_random = np.random.default_rng(self.random.getrandbits(64))
+        self.disease_planner.set_np_random(self.np_random)
+
+        self.reset_observation()
+        self.reset_scheduler()
+        self.reset_grid()
+        self.initialize_agents(
+            infection_fraction=self.initial_infection_fraction,
+            vaccination_fraction=self.initial_vaccination_fraction
         )
+        self.contact_network.reset()
+        self.datacollector.reset()
+        self.running = True
+        self.datacollector.collect(self)
+
+    def reset_observation(self):
+        """
+        Marks all the cells of the observation (and of the arrays
+        maintained along with it) as empty
+        """
+        observation_utils.clear(self.observation_buffer)
+        self.susceptible_mask.fill(False)
+        if self.tile_counts is not None:
+            self.tile_counts.reset()
+        self.change_log = None
+        self.observation_suspended = False
+        self.observation_version += 1
+
+    def reset_scheduler(self):
+        """
+        Resets the timestep, and drops all the pending state transitions
+        """
+        self.schedule.reset()
+
+    def reset_grid(self):
+        """
+        Removes all the agents from the grid
+        """
+        self.agent_store.reset()
 
     ###########################################################################
     ###########################################################################
@@ -202,10 +334,411 @@ class DiseaseSimModel(Model):
     #       - Functions for easy access/aggregation of simulation wide state
     ###########################################################################
 
-    def get_observation(self):
+    def get_observation(self, out=None):
+        """
+        Returns the observation (in the observation_layout)
+
+        The returned array is the live observation buffer of the model,
+        which is updated in place on every tick. When a preallocated `out`
+        array is provided (a slot of a replay buffer for instance),
+        the observation is copied into it instead, and `out` is returned.
+        """
         # assert self.observation.sum(axis=-1).max() <= 1.0
         # Assertion disabled for perf reasons
-        return self.observation
+        if out is None:
+            return self.observation_buffer
+        np.copyto(out, self.observation_buffer)
+        return out
+
+    def get_cell_states(self, xs, ys):
+        """
+        Returns the AgentState.value of the agents at the provided cells
+        (or -1 for the empty cells)
+        """
+        agent_ids = self.agent_store.cells[xs, ys]
+        return np.where(
+            agent_ids == NO_AGENT, -1, self.agent_store.state[agent_ids])
+
+    def update_observation(self, xs, ys):
+        """
+        Rewrites the observation at the provided cells from the AgentStore
+
+        This is the single place where the observation (along with the
+        tile counts and the susceptible mask) is updated when agents
+        change state or move
+        """
+        if self.observation_suspended:
+            return
+        if self.tile_counts is not None:
+            cells = np.unique(
+                np.ravel_multi_index((xs, ys), (self.width, self.height)))
+            xs, ys = np.unravel_index(cells, (self.width, self.height))
+            # The observation still holds the previous states
+            old_states = observation_utils.to_label_map(
+                self.observation[xs, ys])
+
+        cell_states = self.get_cell_states(xs, ys)
+        observation_utils.write_cells(
+            self.observation, (xs, ys), cell_states)
+        self.susceptible_mask[xs, ys] = \
+            cell_states == AgentState.SUSCEPTIBLE.value
+
+        if self.tile_counts is not None:
+            self.tile_counts.update(xs, ys, old_states, cell_states)
+        if self.change_log is not None:
+            self.change_log.record(xs, ys)
+        self.observation_version += 1
+
+    def get_susceptible_mask(self, out=None):
+        """
+        Returns the boolean (width, height) mask of the cells holding
+        susceptible agents, or copies it into `out` if provided
+
+        The returned array is the live mask of the model, which is updated
+        in place on every change of the grid.
+        """
+        if out is None:
+            return self.susceptible_mask
+        np.copyto(out, self.susceptible_mask)
+        return out
+
+    def suspend_observation(self):
+        """
+        Suspends the maintenance of the observation (along with the tile
+        counts, the susceptible mask, the change log and the region
+        queries), which go stale until resume_observation is called
+        """
+        self.observation_suspended = True
+
+    def resume_observation(self):
+        """
+        Resumes the maintenance of the observation, and rebuilds it
+        (once) from the current state of the grid
+        """
+        self.observation_suspended = False
+        xs, ys = np.indices((self.width, self.height)).reshape(2, -1)
+        self.update_observation(xs, ys)
+
+    def get_pooled_observation(self, out=None):
+        """
+        Returns the per state counts over the pooling_tile_size x
+        pooling_tile_size tiles of the grid (in the observation_layout),
+        or copies them into `out` if provided
+        """
+        assert self.tile_counts is not None, \
+            "get_pooled_observation called without a pooling_tile_size"
+        if out is None:
+            return self.tile_counts.counts_buffer
+        np.copyto(out, self.tile_counts.counts_buffer)
+        return out
+
+    def get_observation_crop(self, x, y, width, height, out=None):
+        """
+        Returns the full resolution observation of the width x height
+        crop starting at the cell (x, y), in the observation_layout
+        """
+        _crop = observation_utils.crop(
+            self.observation_buffer, x, y, width, height,
+            self.observation_layout)
+        if out is None:
+            return np.ascontiguousarray(_crop)
+        np.copyto(out, _crop)
+        return out
+
+    def get_observation_window(self, x, y, width, height, out=None):
+        """
+        Returns the full resolution observation of the width x height
+        window centred on the cell (x, y), in the observation_layout
+        (wrapping around the grid edges on toric grids, else holding
+        empty cells beyond the grid edges)
+        """
+        _window = observation_utils.window(
+            self.observation_buffer, x, y, width, height,
+            self.observation_layout, toric=self.toric)
+        if out is None:
+            return np.ascontiguousarray(_window)
+        np.copyto(out, _window)
+        return out
+
+    def enable_change_log(self):
+        """
+        Starts recording the changes of the cells in a ChangeLog
+        (from the current state of the grid)
+        """
+        xs, ys = np.indices((self.width, self.height))
+        self.change_log = ChangeLog(self.get_cell_states(xs, ys))
+
+    def get_observation_deltas(self):
+        """
+        Returns the (x, y, old_state, new_state) changes of the cells
+        since the previous call (or since enable_change_log was called)
+        """
+        assert self.change_log is not None, \
+            "get_observation_deltas called before enable_change_log"
+        return self.change_log.flush(self)
+
+    ###########################################################################
+    ###########################################################################
+    # Region Queries
+    #       - Functions for counting the agents (by state) in regions
+    #         of the grid, backed by an integral image of the grid
+    ###########################################################################
+
+    def get_integral_image(self):
+        """
+        Returns the integral image (summed-area table) of the grid, as an
+        array of shape (width + 1, height + 1, num_states), where
+        [x, y, s] holds the number of agents in the state s in the
+        cells [0, x) x [0, y).
+
+        It is lazily rebuilt (at most once per update of the grid).
+        """
+        if self._integral_image_version != self.observation_version:
+            labels = observation_utils.to_label_map(self.observation)
+            one_hot = labels[..., np.newaxis] == np.arange(len(AgentState))
+            integral_image = np.zeros(
+                (self.width + 1, self.height + 1, len(AgentState)),
+                dtype=np.int32)
+            np.cumsum(
+                np.cumsum(one_hot, axis=0, dtype=np.int32), axis=1,
+                out=integral_image[1:, 1:])
+            self._integral_image = integral_image
+            self._integral_image_version = self.observation_version
+        return self._integral_image
+
+    def _integral_image_at(self, xs, ys):
+        """
+        Returns the number of agents (by state) in the cells [0, x) x [0, y)
+
+        On toric grids, the coordinates can lie outside of the grid, and
+        the counts are the ones of the grid tiled infinitely, else they are
+        clipped to the grid.
+        """
+        integral_image = self.get_integral_image()
+        if not self.toric:
+            return integral_image[
+                np.clip(xs, 0, self.width), np.clip(ys, 0, self.height)]
+
+        qx, rx = np.divmod(xs, self.width)
+        qy, ry = np.divmod(ys, self.height)
+        return (qx * qy)[:, np.newaxis] * \
+            integral_image[self.width, self.height] + \
+            qx[:, np.newaxis] * integral_image[self.width, ry] + \
+            qy[:, np.newaxis] * integral_image[rx, self.height] + \
+            integral_image[rx, ry]
+
+    def count_agents_in_rectangles(self, rectangles, state=None):
+        """
+        Counts the agents in a batch of rectangles, provided as an array
+        of shape (n, 4) of (x0, y0, x1, y1) rows, each covering
+        the cells [x0, x1) x [y0, y1).
+
+        On toric grids, the rectangles can wrap around the grid edges
+        (x0 and y0 can be negative, and x1 and y1 beyond the grid),
+        else they are clipped to the grid.
+
+        Returns an array of shape (n, num_states) of the number of agents
+        in every state, or of shape (n, ) if a state is provided.
+        Every rectangle is answered in constant time.
+        """
+        rectangles = np.asarray(rectangles, dtype=np.int64).reshape(-1, 4)
+        x0, y0, x1, y1 = rectangles.T
+        counts = self._integral_image_at(x1, y1) - \
+            self._integral_image_at(x0, y1) - \
+            self._integral_image_at(x1, y0) + \
+            self._integral_image_at(x0, y0)
+        if state is not None:
+            return counts[:, state.value]
+        return counts
+
+    def count_agents_in_rectangle(self, x0, y0, x1, y1, state=None):
+        """
+        Counts the agents in the cells [x0, x1) x [y0, y1)
+        (see count_agents_in_rectangles)
+        """
+        return self.count_agents_in_rectangles(
+            [(x0, y0, x1, y1)], state=state)[0]
+
+    def count_agents_within_radius(self, xs, ys, radius, state=None):
+        """
+        Counts the agents within `radius` cells (in the Chebyshev distance,
+        as in the Moore neighbourhood) of the provided cells, i.e. in
+        the (2 * radius + 1) x (2 * radius + 1) squares centered on them
+        (including the cells themselves)
+        """
+        xs = np.atleast_1d(xs)
+        ys = np.atleast_1d(ys)
+        return self.count_agents_in_rectangles(
+            np.stack([
+                xs - radius, ys - radius, xs + radius + 1, ys + radius + 1
+            ], axis=1),
+            state=state)
+
+    def find_densest_window(self, width, height, states):
+        """
+        Returns the centre (x, y) of the width x height window
+        (as in get_observation_window) holding the most agents in
+        any of the provided states, or None if there are no such agents
+        """
+        xs, ys = np.indices((self.width, self.height)).reshape(2, -1)
+        x0 = xs - width // 2
+        y0 = ys - height // 2
+        counts = self.count_agents_in_rectangles(
+            np.stack([x0, y0, x0 + width, y0 + height], axis=1))
+        counts = counts[:, [_state.value for _state in states]].sum(axis=1)
+        _index = np.argmax(counts)
+        if counts[_index] == 0:
+            return None
+        return int(xs[_index]), int(ys[_index])
+
+    ###########################################################################
+    ###########################################################################
+    # Agents
+    #       - Functions for accessing and updating the agents
+    #         in the AgentStore
+    ###########################################################################
+
+    def get_agent(self, unique_id):
+        """
+        Returns a lightweight DiseaseSimAgent view of an agent
+        """
+        return DiseaseSimAgent(int(unique_id), self)
+
+    def set_agents_state(self, agent_ids, new_states):
+        """
+        Sets the state of the provided agents
+        and updates the observation accordingly
+        """
+        previous_states = self.agent_store.set_state(agent_ids, new_states)
+
+        # Update Global Observation in model observation buffer
+        self.update_observation(
+            self.agent_store.pos[agent_ids, 0],
+            self.agent_store.pos[agent_ids, 1])
+        return previous_states
+
+    def execute_transitions(self, agent_ids):
+        """
+        Executes the pending state transitions of the provided agents, and
+        schedules their next transitions as per their disease plans
+        """
+        store = self.agent_store
+        new_states = store.next_transition_state[agent_ids]
+        previous_states = self.set_agents_state(agent_ids, new_states)
+        assert np.all(previous_states == new_states - 1), \
+            "Mismatch in state during state_transition"
+
+        has_next = new_states < AgentState.RECOVERED.value
+        store.next_transition_timestep[agent_ids[~has_next]] = NO_TRANSITION
+        store.next_transition_state[agent_ids[~has_next]] = -1
+
+        agent_ids = agent_ids[has_next]
+        # disease_plan[:, k] holds the timestep of the transition
+        # into the state k + 1
+        timesteps = store.disease_plan[agent_ids, new_states[has_next]]
+        store.next_transition_timestep[agent_ids] = timesteps
+        store.next_transition_state[agent_ids] = new_states[has_next] + 1
+        self.schedule.schedule_transitions(agent_ids, timesteps)
+
+    def trigger_infection(self, agent_id, prob_infection=1.0):
+        """
+        Attempts to trigger an infection for an agent, and if infection is
+        triggered, then it returns True, else returns False.
+        """
+        if self.agent_store.is_infection_scheduled[agent_id]:
+            return False
+        if self.random.random() >= prob_infection:
+            return False
+
+        self.trigger_infections(np.array([agent_id]))
+        return True
+
+    def trigger_infections(self, agent_ids):
+        """
+        Triggers the infection of all the provided agents
+        (which should not have an infection scheduled yet)
+        by preparing their disease plans in bulk
+        """
+        store = self.agent_store
+        assert not store.is_infection_scheduled[agent_ids].any(), \
+            "Attempt to trigger an infection for an already infected agent"
+
+        # Prepare the disease plans
+        disease_plans = self.disease_planner.get_disease_plans(
+            len(agent_ids), base_timestep=self.schedule.steps)
+        if (np.diff(disease_plans, axis=1) == 0).any():
+            raise Exception(
+                "Attempt to assign multiple state transition plans for the same timestep")  # noqa
+
+        store.disease_plan[agent_ids] = disease_plans
+        store.next_transition_timestep[agent_ids] = disease_plans[:, 0]
+        store.next_transition_state[agent_ids] = AgentState.EXPOSED.value
+        store.schedule_infections(agent_ids)
+        self.schedule.schedule_transitions(agent_ids, disease_plans[:, 0])
+
+    def move_agent(self, agent_id, new_position):
+        """
+        Move an agent to a new location on the grid
+        and do other associated house keeping tasks
+            - Update global observation in model
+        """
+        new_x, new_y = new_position
+        if self.agent_store.cells[new_x, new_y] != NO_AGENT:
+            raise Exception("Cell not empty")
+        self.move_agents(
+            np.array([agent_id]), np.array([new_x]), np.array([new_y]))
+
+    def move_agents(self, agent_ids, new_xs, new_ys):
+        """
+        Moves the provided agents to the provided (empty and distinct) cells
+        and do other associated house keeping tasks
+            - Update global observation in model
+        """
+        store = self.agent_store
+        xs = store.pos[agent_ids, 0]
+        ys = store.pos[agent_ids, 1]
+        # Move Agents in Grid
+        store.move(agent_ids, new_xs, new_ys)
+        # Update the global observation at the previous and the new coords
+        self.update_observation(
+            np.concatenate([xs, np.atleast_1d(new_xs)]),
+            np.concatenate([ys, np.atleast_1d(new_ys)]))
+
+    def iter_neighborhood(self, x, y):
+        """
+        Iterates over the coordinates of the Moore neighbourhood of a cell
+        """
+        for dx, dy in MOORE_OFFSETS:
+            _x = x + dx
+            _y = y + dy
+            if self.toric:
+                yield _x % self.width, _y % self.height
+            elif 0 <= _x < self.width and 0 <= _y < self.height:
+                yield _x, _y
+
+    def move_agent_to_empty_neighbour(self, agent_id):
+        """
+        Moves an agent to a randomly chosen empty cell in its
+        neighbourhood (if any)
+        """
+        self.move_agents_to_empty_neighbours(np.array([agent_id]))
+
+    def move_agents_to_empty_neighbours(self, agent_ids):
+        """
+        Moves all the provided agents at once, each to a randomly chosen
+        empty cell in its neighbourhood (if any).
+
+        The moves are decided simultaneously : all the agents pick among
+        the cells which are empty before the moves, and when many agents
+        pick the same cell, only one of them (chosen at random) moves there
+        """
+        if len(agent_ids) == 0:
+            return
+        store = self.agent_store
+        movers = (store.pos[agent_ids, 0], store.pos[agent_ids, 1])
+        sources, targets = grid_ops.resolve_moves(
+            store.cells != NO_AGENT, movers, self.toric, self.np_random)
+        self.move_agents(store.cells[sources], *targets)
 
     ###########################################################################
     ###########################################################################
@@ -219,6 +752,16 @@ class DiseaseSimModel(Model):
     def get_population_fraction_by_state(self, state: AgentState):
         return self.schedule.get_agent_fraction_by_state(state)
 
+    def get_state_counts(self):
+        """
+        Returns the number of agents in every state, indexed by
+        AgentState.value
+        """
+        return self.agent_store.state_counts
+
+    def get_timestep(self):
+        return self.schedule.steps
+
     def is_running(self):
         return self.running
 
@@ -253,10 +796,11 @@ class DiseaseSimModel(Model):
         self.n_vaccines -= 1
 
         # Case 1 : Cell is empty
-        if self.grid.is_cell_empty((cell_x, cell_y)):
+        agent_id = self.agent_store.get_agent_id(cell_x, cell_y)
+        if agent_id == NO_AGENT:
             return False, VaccinationResponse.CELL_EMPTY
 
-        agent = self.grid[cell_x][cell_y]
+        agent = self.get_agent(agent_id)
         if agent.state == AgentState.SUSCEPTIBLE:
             # Case 2 : Agent is susceptible, and can be vaccinated
             agent.set_state(AgentState.VACCINATED)
@@ -282,6 +826,53 @@ class DiseaseSimModel(Model):
             return False, VaccinationResponse.AGENT_VACCINATED
         raise NotImplementedError()
 
+    def vaccinate_cells(self, cell_xs, cell_ys):
+        """
+        Bulk version of vaccinate_cell, which vaccinates the agents at
+        the provided cells in order, using one vaccine per cell until
+        the vaccines are exhausted
+
+        Returns an int8 array of the VaccinationResponse.value of every
+        cell, matching the responses of consecutive vaccinate_cell calls
+        """
+        cell_xs = np.asarray(cell_xs, dtype=np.int64).ravel()
+        cell_ys = np.asarray(cell_ys, dtype=np.int64).ravel()
+        responses = np.full(
+            len(cell_xs), VaccinationResponse.AGENT_VACCINES_EXHAUSTED.value,
+            dtype=np.int8)
+
+        n_vaccinations = min(len(cell_xs), max(self.n_vaccines, 0))
+        self.n_vaccines -= n_vaccinations
+        xs, ys = cell_xs[:n_vaccinations], cell_ys[:n_vaccinations]
+        _responses = VACCINATION_RESPONSES_BY_STATE[
+            self.get_cell_states(xs, ys) + 1]
+
+        # Only the first vaccination of a cell can succeed, the following
+        # ones find an already vaccinated agent
+        _, first = np.unique(
+            np.ravel_multi_index((xs, ys), (self.width, self.height)),
+            return_index=True)
+        repeated = np.ones(n_vaccinations, dtype=bool)
+        repeated[first] = False
+        _success = \
+            _responses == VaccinationResponse.VACCINATION_SUCCESS.value
+        _responses[repeated & _success] = \
+            VaccinationResponse.AGENT_VACCINATED.value
+        _success &= ~repeated
+        responses[:n_vaccinations] = _responses
+
+        self.apply_vaccinations(xs[_success], ys[_success])
+        return responses
+
+    def apply_vaccinations(self, xs, ys):
+        """
+        Vaccinates the (susceptible) agents at the provided distinct cells
+        """
+        agent_ids = self.agent_store.cells[xs, ys]
+        self.set_agents_state(
+            agent_ids,
+            np.full(len(agent_ids), AgentState.VACCINATED.value))
+
     ###########################################################################
     ###########################################################################
     # Misc
@@ -296,8 +887,13 @@ class DiseaseSimModel(Model):
             or
             - the fraction of susceptible population has not changed since the
             last N timesteps
+
+        If stop_on_epidemic_end is set, the simulation is also stopped
+        as soon as the epidemic is over (see is_epidemic_over), after
+        fast forwarding to the timestep at which the checks above would
+        have stopped it, so the recorded metrics stay the same.
         """
-        if self.schedule.steps > self.max_timesteps - 1:
+        if self.get_timestep() > self.max_timesteps - 1:
             self.running = False
             return
 
@@ -307,14 +903,27 @@ class DiseaseSimModel(Model):
             self.running = False
             return
 
-        if self.schedule.steps > self.early_stopping_patience:
-            last_N_susceptible_population = \
-                self.datacollector.model_vars["Susceptible"][-1 *
-                                                             self.early_stopping_patience:]  # noqa
-            if len(set(last_N_susceptible_population)) == 1:
+        if self.get_timestep() > self.early_stopping_patience:
+            if self.datacollector.is_susceptible_population_stagnant(
+                    self.early_stopping_patience):
                 self.running = False
                 return
 
+        if self.stop_on_epidemic_end and self.is_epidemic_over():
+            self.fast_forward(self.get_quiescent_ticks_to_completion())
+            self.running = False
+
+    def is_epidemic_over(self):
+        """
+        Returns True if there are no EXPOSED, INFECTIOUS or SYMPTOMATIC
+        agents left, in which case the state counts can not change
+        anymore (except through vaccinations)
+        """
+        state_counts = self.get_state_counts()
+        return state_counts[AgentState.EXPOSED.value] == 0 and \
+            state_counts[AgentState.INFECTIOUS.value] == 0 and \
+            state_counts[AgentState.SYMPTOMATIC.value] == 0
+
     def tick(self):
         """
         a mirror function for the internal step function
@@ -322,34 +931,178 @@ class DiseaseSimModel(Model):
         """
         self.step()
 
+    def tick_many(self, n_ticks, state_counts=None):
+        """
+        Advances the simulation by up to n_ticks ticks, stopping early
+        once the simulation is complete (the first tick is always run,
+        as with tick)
+
+        The quiescent intervals (see skip_quiescent_ticks) are skipped
+        at once, with the same outcome as ticking through them.
+        If a (n_ticks, num_states) `state_counts` array is provided, the
+        per state agent counts after every tick are written into it.
+
+        Returns the number of ticks run
+        """
+        _tick = 0
+        while _tick < n_ticks:
+            if _tick > 0 and not self.running:
+                break
+            _n_ticks = self.skip_quiescent_ticks(n_ticks - _tick)
+            if _n_ticks == 0:
+                self.tick()
+                _n_ticks = 1
+            if state_counts is not None:
+                state_counts[_tick:_tick + _n_ticks] = self.get_state_counts()
+            _tick += _n_ticks
+        return _tick
+
+    def run_to_completion(self, headless=True):
+        """
+        Ticks the simulation until it completes (skipping the quiescent
+        intervals at once, see tick_many)
+
+        In headless mode, the observation is not maintained on every
+        tick, and is only rebuilt once at the end. Only the metrics the
+        rewards and the completion checks rely on (the state counts and
+        the datacollector records) are kept up to date along the way.
+        """
+        if headless:
+            self.suspend_observation()
+        try:
+            while self.running:
+                self.tick_many(self.max_timesteps + 1)
+        finally:
+            if headless:
+                self.resume_observation()
+
+    def get_next_transition_timestep(self):
+        """
+        Returns the earliest timestep (from the current one) with pending
+        state transitions, or None if there are none
+        """
+        return self.schedule.get_next_transition_timestep()
+
+    def advance_timestep(self, n_ticks):
+        """
+        Advances the timestep by n_ticks ticks, without running them
+        """
+        self.schedule.advance(n_ticks)
+
+    def is_quiescent(self):
+        """
+        Returns True if the ticks are no-ops until the next state
+        transition is due : no agent can move, and there are no
+        INFECTIOUS or SYMPTOMATIC agents to spread the infection
+        """
+        state_counts = self.get_state_counts()
+        return self.prob_agent_movement <= 0 and \
+            state_counts[AgentState.INFECTIOUS.value] == 0 and \
+            state_counts[AgentState.SYMPTOMATIC.value] == 0
+
+    def get_quiescent_ticks_to_completion(self):
+        """
+        Returns the number of quiescent ticks (which leave the state counts
+        unchanged) after which simulation_completion_checks stops
+        the simulation
+        """
+        timestep = self.get_timestep()
+        susceptible_count = \
+            self.get_state_counts()[AgentState.SUSCEPTIBLE.value]
+        if susceptible_count <= 0:
+            return 1
+        n_ticks = max(self.max_timesteps - timestep, 1)
+
+        # The susceptible streak after j more records is streak + j
+        streak = self.datacollector.get_susceptible_streak_after(
+            susceptible_count, 0)
+        patience = self.early_stopping_patience
+        if patience > 0:
+            n_ticks = min(n_ticks, max(
+                patience - timestep + 1, patience - streak, 1))
+        elif streak >= self.datacollector.n_records:
+            # All the records are equal (see
+            # is_susceptible_population_stagnant)
+            n_ticks = min(n_ticks, max(patience - timestep + 1, 1))
+        return n_ticks
+
+    def skip_quiescent_ticks(self, max_ticks):
+        """
+        Skips up to max_ticks ticks at once while the simulation is
+        quiescent (see is_quiescent), i.e. until the next state transition
+        is due or the simulation completes
+
+        The skipped ticks are recorded in bulk in the datacollector, so
+        the metrics and the early stopping are the same as when ticking
+        through them.
+
+        Returns the number of ticks skipped
+        """
+        if not self.running or max_ticks <= 0 or not self.is_quiescent():
+            return 0
+        n_ticks = min(max_ticks, self.get_quiescent_ticks_to_completion())
+        next_transition_timestep = self.get_next_transition_timestep()
+        if next_transition_timestep is not None:
+            n_ticks = min(
+                n_ticks, next_transition_timestep - self.get_timestep())
+        if n_ticks <= 0:
+            return 0
+
+        self.fast_forward(n_ticks)
+        self.simulation_completion_checks()
+        return n_ticks
+
+    def fast_forward(self, n_ticks):
+        """
+        Advances the timestep by n_ticks ticks which are known to leave
+        the state counts unchanged, and records them in bulk
+        (without any completion check)
+        """
+        self.datacollector.record_repeated(
+            self.get_state_counts(), self.contact_network.compute_R0(),
+            n_ticks)
+        self.advance_timestep(n_ticks)
+
     def propagate_infections(self):
         """
         Propagates infection during a single simulation step
+
+        Only the at risk cells (the cells holding a SUSCEPTIBLE agent,
+        without any infection scheduled, with at least one INFECTIOUS or
+        SYMPTOMATIC neighbour) are visited.
+        Every infectious neighbour of a susceptible agent independently
+        attempts an infection with prob_infection, so a susceptible agent
+        with k infectious neighbours is infected with a probability of
+        1 - (1 - prob_infection)^k, which is decided with a single draw
         """
-        valid_infectious_agents = []
-        valid_infectious_agents += self.schedule.get_agents_by_state(
-            AgentState.INFECTIOUS)
-        valid_infectious_agents += self.schedule.get_agents_by_state(
-            AgentState.SYMPTOMATIC)
-
-        for _infectious_agent in valid_infectious_agents:
-            target_candidates = self.grid.get_neighbors(
-                pos=_infectious_agent.pos,
-                moore=True,
-                include_center=False,
-                radius=1
-            )
-            for _target_candidate in target_candidates:
-                if _target_candidate.state == AgentState.SUSCEPTIBLE:
-                    was_infection_successful =\
-                         _target_candidate.trigger_infection(
-                            prob_infection=self.prob_infection)
-                    if was_infection_successful:
-                        # Register infection in the contact network
-                        self.contact_network.register_infection_spread(
-                            _infectious_agent,
-                            _target_candidate
-                        )
+        store = self.agent_store
+        xs, ys = store.get_at_risk_cells()
+        if len(xs) == 0:
+            return
+        target_ids = store.cells[xs, ys]
+
+        prob_by_pressure = 1 - (1 - self.prob_infection) ** np.arange(9)
+        infected = self.np_random.random(len(target_ids)) < \
+            prob_by_pressure[store.infection_pressure[xs, ys]]
+        xs, ys, target_ids = xs[infected], ys[infected], target_ids[infected]
+        if len(target_ids) == 0:
+            return
+
+        # Attribute every infection to one of the
+        # infectious neighbours at random
+        nx, ny, inside = grid_ops.moore_neighbours(
+            xs, ys, store.cells.shape, toric=self.toric)
+        neighbour_ids = store.cells[nx, ny]
+        infectious_neighbours = inside & (neighbour_ids != NO_AGENT) & \
+            np.isin(store.state[neighbour_ids], store.INFECTIOUS_STATES)
+        chosen = grid_ops.choose_neighbours(
+            infectious_neighbours, self.np_random)
+        infector_ids = neighbour_ids[chosen, np.arange(len(target_ids))]
+
+        self.trigger_infections(target_ids)
+        # Register infection in the contact network
+        self.contact_network.register_infection_spreads_by_id(
+            infector_ids, target_ids, self.get_timestep())
 
 
 if __name__ == "__main__":
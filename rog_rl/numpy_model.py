@@ -0,0 +1,343 @@
+import numpy as np
+
+from rog_rl.model import DiseaseSimModel
+from rog_rl.agent_state import AgentState
+from rog_rl.vaccination_response import VaccinationResponse
+from rog_rl import grid_ops
+
+# Marker for the cells which do not hold any agent
+EMPTY_CELL = -1
+# Marker for the transitions which are not scheduled
+NO_TRANSITION = np.iinfo(np.int32).max
+
+VACCINATION_RESPONSES = {
+    AgentState.EXPOSED: VaccinationResponse.AGENT_EXPOSED,
+    AgentState.INFECTIOUS: VaccinationResponse.AGENT_INFECTIOUS,
+    AgentState.SYMPTOMATIC: VaccinationResponse.AGENT_SYMPTOMATIC,
+    AgentState.RECOVERED: VaccinationResponse.AGENT_RECOVERED,
+    AgentState.VACCINATED: VaccinationResponse.AGENT_VACCINATED,
+}
+
+
+class _CellView:
+    """
+    Minimal stand-in for an agent sitting in a grid cell
+    (used by the ANSI renderer)
+    """
+    __slots__ = ("state",)
+
+    def __init__(self, state):
+        self.state = state
+
+
+class _StateGridView:
+    """
+    Read only view of the cell state array which mimics the indexing
+    of a mesa Grid, i.e. grid[x][y] returns None for an empty cell
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.width = model.width
+        self.height = model.height
+
+    def __getitem__(self, x):
+        return [
+            None if _state == EMPTY_CELL else _CellView(AgentState(_state))
+            for _state in self.model.state[x]
+        ]
+
+
+class NumpyDiseaseSimModel(DiseaseSimModel):
+    """
+    A vectorized alternative to the Mesa based DiseaseSimModel.
+
+    Instead of holding a python object for every agent, the whole population
+    is held as a set of integer arrays laid out on the grid :
+        - state : the AgentState.value of the agent in every cell
+            (or EMPTY_CELL)
+        - agent_ids : the unique_id of the agent in every cell
+        - disease_plan : for every cell, the timesteps at which its agent
+            transitions into the EXPOSED, INFECTIOUS, SYMPTOMATIC and
+            RECOVERED states (or NO_TRANSITION)
+
+    Infection spread, disease progression, movement and the updates of the
+    observation are all done as whole-array operations.
+
+    The dynamics follow the ones of DiseaseSimModel, and the public API
+    (tick, vaccinate_cell, get_observation, etc) stays the same.
+    """
+
+    ###########################################################################
+    ###########################################################################
+    # Setup Initialization Helper Functions
+    ###########################################################################
+    def initialize_scheduler(self):
+        """
+        There is no scheduler, the model keeps track of the timesteps itself
+        """
+        self.steps = 0
+
+    def initialize_grid(self):
+        """
+        Initializes the cell arrays
+        """
+        shape = (self.width, self.height)
+        self.state = np.full(shape, EMPTY_CELL, dtype=np.int8)
+        self.agent_ids = np.full(shape, -1, dtype=np.int32)
+        self.disease_plan = np.full(
+            (AgentState.RECOVERED.value, ) + shape,
+            NO_TRANSITION, dtype=np.int32)
+        self.state_counts = np.zeros(len(AgentState), dtype=np.int64)
+
+        self.grid = _StateGridView(self)
+
+    def reset_scheduler(self):
+        self.steps = 0
+
+    def reset_grid(self):
+        self.state.fill(EMPTY_CELL)
+        self.agent_ids.fill(-1)
+        self.disease_plan.fill(NO_TRANSITION)
+        self.state_counts.fill(0)
+
+    def initialize_agents(self, infection_fraction, vaccination_fraction):
+        """
+        Intializes the intial agents on the grid
+        """
+        assert 0 < self.population_density <= 1, \
+            "population_density should be between (0, 1]"
+
+        # Assess the actual population
+        self.n_agents = int(self.width * self.height * self.population_density)
+        # Assess the available number of vaccines
+        self.n_vaccines = int(self.n_agents * self.vaccine_density)
+
+        number_of_agents_to_infect = int(infection_fraction * self.n_agents)
+        number_of_agents_to_vaccinate = int(
+            vaccination_fraction * self.n_agents)
+
+        self.max_vaccines = self.n_vaccines + number_of_agents_to_vaccinate
+
+        # Position all the agents at random (distinct) cells
+        cells = self.np_random.choice(
+            self.width * self.height, size=self.n_agents, replace=False)
+        xs, ys = np.unravel_index(cells, (self.width, self.height))
+        self.agent_ids[xs, ys] = np.arange(self.n_agents)
+        self.state[xs, ys] = AgentState.SUSCEPTIBLE.value
+
+        # Seed the infection in a fraction of the agents
+        _infected = slice(0, number_of_agents_to_infect)
+        self.schedule_infections(xs[_infected], ys[_infected])
+
+        # Seed the vaccination in a fraction of the agents
+        _vaccinated = slice(
+            number_of_agents_to_infect,
+            number_of_agents_to_infect + number_of_agents_to_vaccinate)
+        self.state[xs[_vaccinated], ys[_vaccinated]] = \
+            AgentState.VACCINATED.value
+
+        self.state_counts[:] = np.bincount(
+            self.state[xs, ys], minlength=len(AgentState))
+        self.update_observation(xs, ys)
+
+    ###########################################################################
+    ###########################################################################
+    # State Aggregation
+    #       - Functions for easy access/aggregation of simulation wide state
+    ###########################################################################
+
+    def get_cell_states(self, xs, ys):
+        return self.state[xs, ys]
+
+    def get_population_fraction_by_state(self, state: AgentState):
+        return self.state_counts[state.value] / self.n_agents
+
+    def get_state_counts(self):
+        return self.state_counts
+
+    def get_timestep(self):
+        return self.steps
+
+    def get_next_transition_timestep(self):
+        pending = (self.state >= AgentState.SUSCEPTIBLE.value) & \
+            (self.state <= AgentState.SYMPTOMATIC.value)
+        if not pending.any():
+            return None
+        next_transitions = np.take_along_axis(
+            self.disease_plan,
+            np.clip(self.state, 0, AgentState.SYMPTOMATIC.value)[None],
+            axis=0)[0][pending]
+        next_transition_timestep = int(next_transitions.min())
+        if next_transition_timestep == NO_TRANSITION:
+            return None
+        return next_transition_timestep
+
+    def advance_timestep(self, n_ticks):
+        self.steps += n_ticks
+
+    ###########################################################################
+    ###########################################################################
+    # Actions
+    #        - Functions for actions that can be performed on the model
+    ###########################################################################
+
+    def step(self):
+        """
+        A model step. Used for collecting data and advancing the simulation
+        """
+        self.propagate_infections()
+        self.datacollector.collect(self)
+        self.move_agents()
+        self.progress_disease()
+        self.steps += 1
+        self.simulation_completion_checks()
+
+    def vaccinate_cell(self, cell_x, cell_y):
+        """
+        Vaccinates an agent at cell_x, cell_y, if present
+
+        Response with :
+        (is_vaccination_successful, vaccination_response)
+        of types
+        (boolean, VaccinationResponse)
+        """
+
+        # Case 0 : No vaccines left
+        if self.n_vaccines <= 0:
+            return False, VaccinationResponse.AGENT_VACCINES_EXHAUSTED
+        self.n_vaccines -= 1
+
+        _state = self.state[cell_x, cell_y]
+        # Case 1 : Cell is empty
+        if _state == EMPTY_CELL:
+            return False, VaccinationResponse.CELL_EMPTY
+
+        _state = AgentState(_state)
+        if _state == AgentState.SUSCEPTIBLE:
+            # Case 2 : Agent is susceptible, and can be vaccinated
+            self.apply_vaccinations(np.array([cell_x]), np.array([cell_y]))
+            return True, VaccinationResponse.VACCINATION_SUCCESS
+        # Case 3-7 : Vaccinating the agent is a waste of vaccination
+        return False, VACCINATION_RESPONSES[_state]
+
+    def apply_vaccinations(self, xs, ys):
+        """
+        Vaccinates the (susceptible) agents at the provided distinct cells
+        """
+        self.state[xs, ys] = AgentState.VACCINATED.value
+        self.disease_plan[:, xs, ys] = NO_TRANSITION
+        self.state_counts[AgentState.SUSCEPTIBLE.value] -= len(xs)
+        self.state_counts[AgentState.VACCINATED.value] += len(xs)
+        self.update_observation(xs, ys)
+
+    ###########################################################################
+    ###########################################################################
+    # Misc
+    ###########################################################################
+
+    def schedule_infections(self, xs, ys):
+        """
+        Prepares the disease plan for the agents at the provided cells,
+        starting at the current timestep
+        """
+        disease_plans = self.disease_planner.get_disease_plans(
+            len(xs), base_timestep=self.steps)
+        self.disease_plan[:, xs, ys] = disease_plans.T
+
+    def propagate_infections(self):
+        """
+        Propagates infection during a single simulation step
+
+        Every infectious neighbour of a susceptible agent independently
+        attempts an infection with prob_infection, so a susceptible agent
+        with k infectious neighbours is infected with a probability of
+        1 - (1 - prob_infection)^k
+        """
+        infectious = (self.state == AgentState.INFECTIOUS.value) | \
+            (self.state == AgentState.SYMPTOMATIC.value)
+        if not infectious.any():
+            return
+
+        infection_pressure = grid_ops.count_neighbours(
+            infectious, toric=self.toric)
+        at_risk = (self.state == AgentState.SUSCEPTIBLE.value) & \
+            (self.disease_plan[AgentState.SUSCEPTIBLE.value] == NO_TRANSITION) & \
+            (infection_pressure > 0)  # noqa
+        xs, ys = np.nonzero(at_risk)
+
+        prob_by_pressure = 1 - (1 - self.prob_infection) ** np.arange(9)
+        infected = self.np_random.random(len(xs)) < \
+            prob_by_pressure[infection_pressure[xs, ys]]
+        xs, ys = xs[infected], ys[infected]
+        if len(xs) == 0:
+            return
+
+        self.schedule_infections(xs, ys)
+
+        # Register the infections in the contact network, by attributing
+        # every infection to one of the infectious neighbours at random
+        infectious_neighbours = grid_ops.neighbour_stack(
+            infectious, toric=self.toric)[:, xs, ys]
+        chosen = grid_ops.choose_neighbours(
+            infectious_neighbours, self.np_random)
+        infector_ids = self.agent_ids[grid_ops.neighbour_cells(
+            (xs, ys), np.array(grid_ops.MOORE_OFFSETS)[chosen],
+            self.state.shape)]
+        self.contact_network.register_infection_spreads_by_id(
+            infector_ids, self.agent_ids[xs, ys], self.get_timestep())
+
+    def move_agents(self):
+        """
+        Moves every agent, with a probability of prob_agent_movement,
+        to a random empty cell in its neighbourhood
+        """
+        if self.prob_agent_movement <= 0:
+            return
+        occupied = self.state != EMPTY_CELL
+        movers = occupied & \
+            (self.np_random.random(occupied.shape) < self.prob_agent_movement)
+        (src_x, src_y), (dst_x, dst_y) = grid_ops.resolve_moves(
+            occupied, np.nonzero(movers), self.toric, self.np_random)
+
+        for _array in [self.state, self.agent_ids]:
+            _array[dst_x, dst_y] = _array[src_x, src_y]
+        self.disease_plan[:, dst_x, dst_y] = self.disease_plan[:, src_x, src_y]
+        self.state[src_x, src_y] = EMPTY_CELL
+        self.agent_ids[src_x, src_y] = -1
+        self.disease_plan[:, src_x, src_y] = NO_TRANSITION
+
+        self.update_observation(
+            np.concatenate([src_x, dst_x]), np.concatenate([src_y, dst_y]))
+
+    def progress_disease(self):
+        """
+        Executes all the state transitions due at the current timestep
+        """
+        _state = np.minimum(self.state, AgentState.SYMPTOMATIC.value)
+        _state[_state == EMPTY_CELL] = 0
+        due = (self.state != EMPTY_CELL) & \
+            (self.state <= AgentState.SYMPTOMATIC.value) & \
+            (np.take_along_axis(
+                self.disease_plan, _state[None], axis=0)[0] <= self.steps)
+        xs, ys = np.nonzero(due)
+        updated_x, updated_y = xs, ys
+
+        # The loop handles the (rare) cases where more than one transition
+        # of the same agent is due at the same timestep
+        while len(xs) > 0:
+            previous_state = self.state[xs, ys]
+            self.state[xs, ys] += 1
+            self.state_counts -= np.bincount(
+                previous_state, minlength=len(AgentState))
+            self.state_counts += np.bincount(
+                previous_state + 1, minlength=len(AgentState))
+
+            new_state = previous_state + 1
+            still_due = (new_state <= AgentState.SYMPTOMATIC.value)
+            still_due[still_due] = self.disease_plan[
+                new_state[still_due], xs[still_due], ys[still_due]] \
+                <= self.steps
+            xs, ys = xs[still_due], ys[still_due]
+
+        self.update_observation(updated_x, updated_y)
@@ -0,0 +1,360 @@
+#!/usr/bin/env python
+"""
+Helpers for the encoding of the observations of the simulation models.
+
+The observations can be encoded in one of the following modes :
+    - "one_hot" : an array of shape (width, height, num_states), where
+        every AgentState is marked in a separate channel, in any of the
+        supported OBSERVATION_DTYPES
+    - "label_map" : a single channel int8 array of shape (width, height),
+        holding the AgentState.value of the agent in every cell
+        (or EMPTY_CELL_LABEL for the empty cells)
+
+The observations can be laid out in one of the following layouts :
+    - "whc" : (width, height, num_states), or (width, height) for
+        the label maps
+    - "chw" : (num_states, height, width), or (height, width) for
+        the label maps (channel first, as expected by torch models)
+
+The models always write to a (width, height, num_states) `grid_view`
+of their observation buffers, which are allocated in the configured
+layout, so no transposes are needed to produce the observations.
+
+All the helpers support leading batch dimensions (before width, height).
+The label maps are the only int8 observations, which is how the helpers
+tell the two modes apart.
+"""
+from gym import spaces
+import numpy as np
+
+from rog_rl.agent_state import AgentState
+
+OBSERVATION_MODES = ["one_hot", "label_map"]
+OBSERVATION_DTYPES = ["float32", "float64", "uint8", "bool"]
+OBSERVATION_LAYOUTS = ["whc", "chw"]
+
+LABEL_MAP_DTYPE = np.int8
+# Label of the empty cells in the label map observations
+EMPTY_CELL_LABEL = -1
+
+
+def validate_observation_config(
+        observation_mode, observation_dtype, observation_layout="whc"):
+    if observation_mode not in OBSERVATION_MODES:
+        raise Exception(
+            "Unknown observation mode : {}. Expected one of : {}".format(
+                observation_mode, OBSERVATION_MODES))
+    if np.dtype(observation_dtype).name not in OBSERVATION_DTYPES:
+        raise Exception(
+            "Unsupported observation dtype : {}. Expected one of : {}".format(
+                observation_dtype, OBSERVATION_DTYPES))
+    if observation_layout not in OBSERVATION_LAYOUTS:
+        raise Exception(
+            "Unknown observation layout : {}. Expected one of : {}".format(
+                observation_layout, OBSERVATION_LAYOUTS))
+
+
+def get_observation_dtype(observation_mode, observation_dtype):
+    """
+    Returns the dtype of the observations in the provided mode
+    """
+    if observation_mode == "label_map":
+        return np.dtype(LABEL_MAP_DTYPE)
+    return np.dtype(observation_dtype)
+
+
+def get_observation_shape(
+        grid_shape, observation_mode, observation_layout="whc"):
+    """
+    Returns the shape of the observations of a grid of shape
+    (*batch_shape, width, height) in the provided mode and layout
+    """
+    *batch_shape, width, height = grid_shape
+    if observation_layout == "chw":
+        shape = (height, width)
+        if observation_mode == "one_hot":
+            shape = (len(AgentState), ) + shape
+    else:
+        shape = (width, height)
+        if observation_mode == "one_hot":
+            shape = shape + (len(AgentState), )
+    return tuple(batch_shape) + shape
+
+
+def allocate_observation(
+        grid_shape, observation_mode="one_hot", observation_dtype="float32",
+        observation_layout="whc"):
+    """
+    Allocates an observation of empty cells, for a grid of shape
+    (*batch_shape, width, height), in the provided layout
+    """
+    validate_observation_config(
+        observation_mode, observation_dtype, observation_layout)
+    shape = get_observation_shape(
+        grid_shape, observation_mode, observation_layout)
+    if observation_mode == "label_map":
+        return np.full(shape, EMPTY_CELL_LABEL, dtype=LABEL_MAP_DTYPE)
+    return np.zeros(shape, dtype=observation_dtype)
+
+
+def grid_view(observation, observation_layout="whc"):
+    """
+    Returns a view of an observation in the provided layout,
+    indexed as (*batch_shape, width, height, num_states)
+    (or (*batch_shape, width, height) for the label maps)
+    """
+    if observation_layout == "whc":
+        return observation
+    n_grid_dims = 2 if observation.dtype == LABEL_MAP_DTYPE else 3
+    n_batch_dims = observation.ndim - n_grid_dims
+    return observation.transpose(
+        tuple(range(n_batch_dims)) +
+        tuple(range(observation.ndim - 1, n_batch_dims - 1, -1)))
+
+
+def build_observation_space(
+        width, height, observation_mode="one_hot",
+        observation_dtype="float32", observation_layout="whc"):
+    """
+    Returns the observation_space matching the provided observation config
+    """
+    validate_observation_config(
+        observation_mode, observation_dtype, observation_layout)
+    dtype = get_observation_dtype(observation_mode, observation_dtype)
+    shape = get_observation_shape(
+        (width, height), observation_mode, observation_layout)
+    if observation_mode == "label_map":
+        return spaces.Box(
+            low=EMPTY_CELL_LABEL,
+            high=len(AgentState) - 1,
+            shape=shape,
+            dtype=dtype)
+    return spaces.Box(
+        low=0,
+        high=1,
+        shape=shape,
+        dtype=dtype)
+
+
+def clear(observation):
+    """
+    Marks all the cells of an observation (in any layout) as empty
+    """
+    if observation.dtype == LABEL_MAP_DTYPE:
+        observation.fill(EMPTY_CELL_LABEL)
+    else:
+        observation.fill(0)
+
+
+def write_cells(observation, cells, cell_states):
+    """
+    Rewrites the provided cells (an index tuple) of the observation,
+    given the state of the agent in each of them
+    (or a negative value for the empty cells)
+    """
+    if observation.dtype == LABEL_MAP_DTYPE:
+        observation[cells] = np.where(
+            cell_states < 0, EMPTY_CELL_LABEL, cell_states)
+        return
+
+    observation[cells] = 0
+    _occupied = cell_states >= 0
+    observation[
+        tuple(_index[_occupied] for _index in cells) +
+        (cell_states[_occupied], )] = 1
+
+
+def write_grid(observation, cell_states):
+    """
+    Rewrites the whole observation, given the state of the agent in
+    every cell (or a negative value for the empty cells)
+    """
+    if observation.dtype == LABEL_MAP_DTYPE:
+        observation[...] = np.where(
+            cell_states < 0, EMPTY_CELL_LABEL, cell_states)
+        return
+    observation[...] = cell_states[..., np.newaxis] == \
+        np.arange(len(AgentState))
+
+
+def get_state_mask(observation, state: AgentState):
+    """
+    Returns a boolean mask of the cells holding agents in
+    the provided state
+    """
+    if observation.dtype == LABEL_MAP_DTYPE:
+        return observation == state.value
+    return observation[..., state.value].astype(bool)
+
+
+def to_label_map(observation):
+    """
+    Returns the label map encoding of an observation
+    (in any of the observation modes)
+    """
+    if observation.dtype == LABEL_MAP_DTYPE:
+        return observation
+    return np.where(
+        observation.any(axis=-1),
+        observation.argmax(axis=-1),
+        EMPTY_CELL_LABEL).astype(LABEL_MAP_DTYPE)
+
+
+class ObservationPacker:
+    """
+    Packs observations into 3 bits per cell (enough for the empty cells
+    and the 6 AgentStates), and unpacks them back into exactly the arrays
+    returned by the models (for the provided observation config).
+
+    The packed observations are uint8 arrays of shape
+    (*batch_shape, packed_size), so a batch of observations of shape
+    (*batch_shape, width, height, ...) is packed and unpacked at once.
+    """
+    BITS_PER_CELL = 3
+
+    def __init__(
+            self, width, height, observation_mode="one_hot",
+            observation_dtype="float32", observation_layout="whc"):
+        validate_observation_config(
+            observation_mode, observation_dtype, observation_layout)
+        self.grid_shape = (width, height)
+        self.observation_mode = observation_mode
+        self.observation_layout = observation_layout
+        self.observation_dtype = observation_dtype
+
+        self.n_bits = width * height * self.BITS_PER_CELL
+        self.packed_size = (self.n_bits + 7) // 8
+        self._bit_shifts = np.arange(self.BITS_PER_CELL, dtype=np.uint8)
+
+    def pack(self, observation):
+        """
+        Packs a (batch of) observation(s)
+        """
+        n_grid_dims = 2 if self.observation_mode == "label_map" else 3
+        batch_shape = observation.shape[:observation.ndim - n_grid_dims]
+
+        # Shift the labels to 0 (empty cells) .. num_states
+        observation = grid_view(observation, self.observation_layout)
+        labels = to_label_map(observation).astype(np.uint8) + 1
+        labels = labels.reshape(batch_shape + (-1, 1))
+        bits = (labels >> self._bit_shifts) & 1
+        return np.packbits(
+            bits.reshape(batch_shape + (self.n_bits, )), axis=-1)
+
+    def unpack(self, packed):
+        """
+        Unpacks a (batch of) packed observation(s)
+        """
+        batch_shape = packed.shape[:-1]
+        bits = np.unpackbits(packed, axis=-1, count=self.n_bits)
+        bits = bits.reshape(batch_shape + (-1, self.BITS_PER_CELL))
+        labels = (bits << self._bit_shifts).sum(axis=-1, dtype=np.int8) - 1
+        labels = labels.reshape(batch_shape + self.grid_shape)
+
+        observation = allocate_observation(
+            labels.shape,
+            observation_mode=self.observation_mode,
+            observation_dtype=self.observation_dtype,
+            observation_layout=self.observation_layout)
+        write_grid(grid_view(observation, self.observation_layout), labels)
+        return observation
+
+
+class TileCounts:
+    """
+    Maintains the number of agents in every state over the
+    tile_size x tile_size tiles of a grid (the tiles on the right and
+    bottom edges are smaller if the grid size is not a multiple of
+    tile_size).
+
+    The counts are held in an int32 array in the provided layout
+    ((n_tiles_x, n_tiles_y, num_states) for "whc"), and are updated
+    incrementally from the (old_state, new_state) of the cells which
+    change, so they never have to be recomputed from the whole grid.
+    """
+
+    def __init__(self, width, height, tile_size, observation_layout="whc"):
+        assert tile_size >= 1, "tile_size should be a positive integer"
+        self.tile_size = tile_size
+        self.observation_layout = observation_layout
+        self.tiles_shape = (
+            (width + tile_size - 1) // tile_size,
+            (height + tile_size - 1) // tile_size)
+        self.counts_buffer = np.zeros(
+            get_observation_shape(
+                self.tiles_shape, "one_hot", observation_layout),
+            dtype=np.int32)
+        self.counts = grid_view(self.counts_buffer, observation_layout)
+
+    def reset(self):
+        """
+        Resets all the counts to zero
+        """
+        self.counts_buffer.fill(0)
+
+    def update(self, xs, ys, old_states, new_states):
+        """
+        Updates the counts given the previous and the new states of
+        the provided (distinct) cells, where the empty cells are marked
+        with negative states
+        """
+        tile_xs = xs // self.tile_size
+        tile_ys = ys // self.tile_size
+        _old = old_states >= 0
+        np.subtract.at(
+            self.counts,
+            (tile_xs[_old], tile_ys[_old], old_states[_old]), 1)
+        _new = new_states >= 0
+        np.add.at(
+            self.counts,
+            (tile_xs[_new], tile_ys[_new], new_states[_new]), 1)
+
+
+def crop(observation, x, y, width, height, observation_layout="whc"):
+    """
+    Returns a view of the width x height crop, starting at the cell (x, y),
+    of an observation in the provided layout
+    """
+    _grid_view = grid_view(observation, observation_layout)
+    assert 0 <= x and x + width <= _grid_view.shape[0] and \
+        0 <= y and y + height <= _grid_view.shape[1], \
+        "The crop should lie within the grid"
+    # grid_view is its own inverse
+    return grid_view(
+        _grid_view[x:x + width, y:y + height], observation_layout)
+
+
+def window(
+        observation, x, y, width, height, observation_layout="whc",
+        toric=True):
+    """
+    Returns the width x height window centred on the cell (x, y) of
+    an observation in the provided layout
+
+    When the window lies within the grid, it is a view of the observation
+    (see crop), else it is gathered at once, wrapping around the grid
+    edges on toric grids, and holding empty cells beyond the grid edges
+    otherwise.
+    """
+    _grid_view = grid_view(observation, observation_layout)
+    grid_width, grid_height = _grid_view.shape[:2]
+    x0 = x - width // 2
+    y0 = y - height // 2
+    if 0 <= x0 and x0 + width <= grid_width and \
+            0 <= y0 and y0 + height <= grid_height:
+        return crop(observation, x0, y0, width, height, observation_layout)
+
+    xs = np.arange(x0, x0 + width)
+    ys = np.arange(y0, y0 + height)
+    if toric:
+        _window = _grid_view[np.ix_(xs % grid_width, ys % grid_height)]
+    else:
+        _window = np.zeros(
+            (width, height) + _grid_view.shape[2:], dtype=observation.dtype)
+        if observation.dtype == LABEL_MAP_DTYPE:
+            _window[...] = EMPTY_CELL_LABEL
+        _inside_x = (xs >= 0) & (xs < grid_width)
+        _inside_y = (ys >= 0) & (ys < grid_height)
+        _window[np.ix_(_inside_x, _inside_y)] = \
+            _grid_view[np.ix_(xs[_inside_x], ys[_inside_y])]
+    return grid_view(_window, observation_layout)
@@ -1,53 +1,136 @@
 #!/usr/bin/env python
+import numpy as np
 
-from mesa import Agent, Model
+from mesa import Model
 from mesa.time import RandomActivation
 from rog_rl.agent_state import AgentState
 
 
 class CustomScheduler(RandomActivation):
+    """
+    Instead of stepping every agent on every tick, the scheduler only
+    visits :
+        - the agents which pass their movement check (which are moved
+          in bulk), and
+        - the agents which have a state transition due at the current tick
+
+    Pending state transitions are bucketed by their timestep in
+    a timing wheel (a dict of timestep => list of agent unique_ids),
+    so the cost of a tick scales with the number of events, and not with
+    the number of agents.
+
+    The agents themselves live in the AgentStore of the model, and are
+    only materialized as DiseaseSimAgent views on demand.
+    """
     def __init__(self, model: Model) -> None:
         super().__init__(model)
 
-        self._agent_state_index = {}
-        for state in AgentState:
-            self._agent_state_index[state] = {}
+        self._transition_wheel = {}
+
+    @property
+    def agents(self):
+        return [
+            self.model.get_agent(_agent_id)
+            for _agent_id in range(self.get_agent_count())
+        ]
 
-    def add(self, agent: Agent) -> None:
-        self._agents[agent.unique_id] = agent
-        self._agent_state_index[agent.state][agent.unique_id] = agent
+    def reset(self) -> None:
+        """
+        Resets the timestep, and drops all the pending state transitions
+        """
+        self.steps = 0
+        self.time = 0
+        self._transition_wheel.clear()
 
-    def remove(self, agent: Agent) -> None:
-        del self._agents[agent.unique_id]
+    def get_agent_count(self) -> int:
+        """ Returns the current number of agents in the model. """
+        return self.model.agent_store.n_agents
 
-        for state in AgentState:
+    def schedule_transition(self, agent_id: int, timestep: int) -> None:
+        """
+        Registers that the agent with the provided unique_id has to
+        execute its next state transition at the provided timestep
+        """
+        try:
+            self._transition_wheel[timestep].append(agent_id)
+        except KeyError:
+            self._transition_wheel[timestep] = [agent_id]
+
+    def schedule_transitions(self, agent_ids, timesteps) -> None:
+        """
+        Bulk version of schedule_transition
+        """
+        for _timestep in np.unique(timesteps).tolist():
+            _agent_ids = agent_ids[timesteps == _timestep].tolist()
             try:
-                del self._agent_state_index[state][agent.unique_id]
+                self._transition_wheel[_timestep].extend(_agent_ids)
             except KeyError:
-                pass
+                self._transition_wheel[_timestep] = _agent_ids
+
+    def get_next_transition_timestep(self):
+        """
+        Returns the earliest timestep (from the current one) with pending
+        state transitions, or None if there are none
+        """
+        return min(
+            (_timestep for _timestep in self._transition_wheel
+             if _timestep >= self.steps),
+            default=None)
 
-    def update_agent_state_in_registry(
-            self,
-            agent: Agent,
-            previous_state: AgentState) -> None:
-        del self._agent_state_index[previous_state][agent.unique_id]
-        self._agent_state_index[agent.state][agent.unique_id] = agent
+    def advance(self, n_ticks) -> None:
+        """
+        Advances the timestep by n_ticks ticks, without any activation
+        (for the ticks which are known to be no-ops)
+        """
+        self.steps += n_ticks
+        self.time += n_ticks
 
-        # Update the Model Observation
-        # self.model.observation[agent.pos]
-        agent_x, agent_y = agent.pos
-        self.model.observation[agent_x, agent_y, previous_state.value] = 0
-        self.model.observation[agent_x, agent_y, agent.state.value] = 1
+    def step(self) -> None:
+        self.move_agents()
+        self.process_state_transitions()
+        self.steps += 1
+        self.time += 1
+
+    def move_agents(self) -> None:
+        """
+        Lets every agent move with a probability of prob_agent_movement.
+
+        The agents which pass the movement check are all decided at once,
+        and are then moved in bulk by the model.
+        """
+        prob_agent_movement = self.model.prob_agent_movement
+        if prob_agent_movement <= 0:
+            return
+
+        n_agents = self.get_agent_count()
+        if prob_agent_movement >= 1:
+            movers = np.arange(n_agents)
+        else:
+            movers = np.flatnonzero(
+                self.model.np_random.random(n_agents) < prob_agent_movement)
+        self.model.move_agents_to_empty_neighbours(movers)
+
+    def process_state_transitions(self) -> None:
+        """
+        Executes all the state transitions due at the current timestep
+        """
+        agent_ids = self._transition_wheel.pop(self.steps, None)
+        if agent_ids:
+            self.model.execute_transitions(np.array(agent_ids))
 
     def get_agents_by_state(self, state: AgentState):
-        return list(self._agent_state_index[state].values())
+        return [
+            self.model.get_agent(_agent_id)
+            for _agent_id in
+            self.model.agent_store.get_agent_ids_by_state(state).tolist()
+        ]
 
     def get_agent_count_by_state(self, state: AgentState) -> int:
         """ Returns the current number of agents in a particular state. """
-        return len(self._agent_state_index[state].keys())
+        return int(self.model.agent_store.state_counts[state.value])
 
-    def get_agent_fraction_by_state(self, state: AgentState) -> int:
-        """ Returns the current number of agents in a particular state. """
+    def get_agent_fraction_by_state(self, state: AgentState) -> float:
+        """ Returns the current fraction of agents in a particular state. """
         _frac = \
-            len(self._agent_state_index[state].keys()) / self.get_agent_count()
+            self.get_agent_count_by_state(state) / self.get_agent_count()
         return _frac
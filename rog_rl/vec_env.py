@@ -0,0 +1,159 @@
+from gym import spaces
+from gym.utils import seeding
+from gym.vector import VectorEnv
+
+import numpy as np
+
+from rog_rl.agent_state import AgentState
+from rog_rl.batched_model import BatchedDiseaseSimModel
+from rog_rl.env import ActionType, RogSimEnv
+from rog_rl.vaccination_response import VaccinationResponse
+
+
+class RogSimVecEnv(VectorEnv):
+    """
+    Steps num_envs independent RogSim simulations in a single process,
+    holding all of them as stacked arrays of shape
+    (num_envs, width, height) in a BatchedDiseaseSimModel.
+
+    It accepts the same config as RogSimEnv (the "engine", "use_renderer"
+    and "dummy_simulation" keys are ignored), and takes actions as a
+    (num_envs, 3) batch of RogSimEnv actions.
+
+    The sub-environments are reset automatically when they are done :
+    the observation returned for them is the first observation of the
+    next episode, while their reward, done and info entries still
+    describe the episode which just ended.
+    """
+
+    def __init__(self, num_envs=8, config={}):
+        # Resolve the config and the spaces of a single environment
+        _env = RogSimEnv(config=config)
+        self.config = _env.config
+        self.width = _env.width
+        self.height = _env.height
+
+        super().__init__(
+            num_envs, _env.observation_space, _env.action_space)
+        self.action_space = spaces.MultiDiscrete(
+            np.tile(_env.action_space.nvec, (num_envs, 1)))
+
+        self._model = None
+        self.np_random = np.random
+        self.running_score = np.zeros(num_envs)
+        self.cumulative_reward = np.zeros(num_envs)
+
+    def reset_wait(self, **kwargs):
+        if self._model is None:
+            self._model = BatchedDiseaseSimModel(
+                n_envs=self.num_envs,
+                width=self.config['width'],
+                height=self.config['height'],
+                population_density=self.config['population_density'],
+                vaccine_density=self.config['vaccine_density'],
+                initial_infection_fraction=self.config[
+                    'initial_infection_fraction'],
+                initial_vaccination_fraction=self.config[
+                    'initial_vaccination_fraction'],
+                prob_infection=self.config['prob_infection'],
+                prob_agent_movement=self.config['prob_agent_movement'],
+                disease_planner_config=self.config['disease_planner_config'],
+                max_timesteps=self.config['max_simulation_timesteps'],
+                early_stopping_patience=self.config[
+                    'early_stopping_patience'],
+                toric=self.config['toric'],
+                seed=self.np_random.randint(2**31),
+                observation_mode=self.config['observation_mode'],
+                observation_dtype=self.config['observation_dtype'],
+                observation_layout=self.config['observation_layout'],
+                stop_on_epidemic_end=self.config['stop_on_epidemic_end']
+            )
+        else:
+            self._model.seed(self.np_random.randint(2**31))
+
+        self.reset_envs(np.arange(self.num_envs))
+        return self._model.get_observation()
+
+    def reset_envs(self, env_ids):
+        """
+        Resets the sub-environments with the provided env_ids in place
+        """
+        env_mask = np.zeros(self.num_envs, dtype=bool)
+        env_mask[env_ids] = True
+
+        self._model.reset(env_ids)
+        # Tick models
+        self._model.tick(env_mask)
+
+        self.running_score[env_ids] = \
+            self._model.get_population_fraction_by_state(
+                AgentState.SUSCEPTIBLE)[env_ids]
+        self.cumulative_reward[env_ids] = 0
+
+    def get_current_game_metrics(self):
+        """
+        Returns a dictionary containing important game metrics
+        of all the sub-environments as arrays
+        """
+        _d = {}
+        # current population fraction of different states
+        for _state in AgentState:
+            _key = "population.{}".format(_state.name)
+            _d[_key] = self._model.get_population_fraction_by_state(_state)
+        # Add R0 to the game metrics
+        _d["R0/10"] = self._model.compute_R0()/10.0
+        return _d
+
+    def step_async(self, actions):
+        self._actions = actions
+
+    def step_wait(self, out=None, **kwargs):
+        if self._model is None:
+            raise Exception("env.step() called before calling env.reset()")
+
+        actions = np.asarray(self._actions)
+        assert self.action_space.contains(actions), \
+            "%r (%s) invalid" % (actions, type(actions))
+        actions = actions.astype(np.int64)
+        action_type = actions[:, 0]
+
+        self._model.tick(action_type == ActionType.STEP.value)
+
+        vaccinate_ids = np.flatnonzero(
+            action_type == ActionType.VACCINATE.value)
+        _, responses = self._model.vaccinate_cells(
+            vaccinate_ids,
+            actions[vaccinate_ids, 1], actions[vaccinate_ids, 2])
+
+        # Force Run simulation to completion if
+        # run out of vaccines
+        exhausted = np.zeros(self.num_envs, dtype=bool)
+        exhausted[vaccinate_ids[
+            responses == VaccinationResponse.AGENT_VACCINES_EXHAUSTED.value
+        ]] = True
+        self._model.run_to_completion(exhausted)
+
+        # Compute difference in game score
+        current_score = self._model.get_population_fraction_by_state(
+            AgentState.SUSCEPTIBLE)
+        _step_reward = current_score - self.running_score
+        self.cumulative_reward += _step_reward
+        self.running_score = current_score
+
+        _info = self.get_current_game_metrics()
+        _done = ~self._model.running
+
+        # Auto-reset the sub-environments which are done
+        done_ids = np.flatnonzero(_done)
+        if len(done_ids) > 0:
+            self.reset_envs(done_ids)
+
+        return self._model.get_observation(out=out), \
+            _step_reward, _done, _info
+
+    def seed(self, seed=None):
+        self.np_random, seed = seeding.np_random(seed)
+        return [seed]
+
+    def close_extras(self, **kwargs):
+        self._model = None
@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+import gym
+from gym import spaces
+import numpy as np
+
+from rog_rl.observation import ObservationPacker
+
+
+class PackedObservationWrapper(gym.ObservationWrapper):
+    """
+    Returns the observations of a RogSimEnv packed into 3 bits per cell
+    (as uint8 arrays of shape (packed_size, )), which is well suited
+    for storing large numbers of observations.
+
+    `unpack` restores (a batch of) packed observations into exactly the
+    arrays returned by the wrapped environment.
+    """
+
+    def __init__(self, env):
+        super().__init__(env)
+        # The windowed observations only cover the observation_window
+        width, height = env.config["observation_window"] or \
+            (env.width, env.height)
+        self.packer = ObservationPacker(
+            width, height,
+            observation_mode=env.config["observation_mode"],
+            observation_dtype=env.config["observation_dtype"],
+            observation_layout=env.config["observation_layout"])
+        self.observation_space = spaces.Box(
+            low=0, high=255,
+            shape=(self.packer.packed_size, ), dtype=np.uint8)
+
+    def observation(self, observation):
+        return self.packer.pack(observation)
+
+    def unpack(self, packed_observation):
+        return self.packer.unpack(packed_observation)
@@ -1,4 +1,3 @@
-from rog_rl.agent import DiseaseSimAgent
 from rog_rl.model import DiseaseSimModel
 
 
@@ -13,17 +12,12 @@ def test_prob_movement_0():
     model = DiseaseSimModel(
         width=50,
         height=50,
-        population_density=1.0/50
+        population_density=1.0/2500,
+        prob_agent_movement=0.0
     )
 
-    unique_id = "uid"
-    agent = DiseaseSimAgent(
-                unique_id,
-                model,
-                prob_agent_movement=0.0,
-                moore=True
-    )
-    agent.pos = (0, 0)
+    agent = model.get_agent(0)
+    agent.move_to((0, 0))
     for k in range(100):
         agent.random_move()
         assert agent.pos == (0, 0)
@@ -41,18 +35,15 @@ def test_prob_movement_1():
     model = DiseaseSimModel(
         width=50,
         height=50,
-        population_density=1.0/50
+        population_density=1.0/2500,
+        prob_agent_movement=1.0
     )
 
-    unique_id = "uid"
-    agent = DiseaseSimAgent(
-                unique_id,
-                model,
-                prob_agent_movement=1.0,
-                moore=True
-    )
-    agent.pos = (0, 0)
+    agent = model.get_agent(0)
+    agent.move_to((0, 0))
     for k in range(100):
         previous_position = agent.pos
         agent.random_move()
         assert agent.pos != previous_position
+        assert model.get_observation().sum() == 1
+        assert model.grid[agent.pos[0]][agent.pos[1]].unique_id == 0
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+
+"""
+Tests the AgentStore
+"""
+import numpy as np
+import pytest
+
+from rog_rl.agent_state import AgentState
+from rog_rl import grid_ops
+from rog_rl.agent_store import AgentStore, NO_AGENT
+from rog_rl.model import DiseaseSimModel
+
+
+def test_state_counts_follow_state_changes():
+    """
+    Tests that the per state counts are kept in sync with the states
+    """
+    store = AgentStore(n_agents=10, width=5, height=5)
+    store.set_state(
+        np.array([0, 1, 2]),
+        np.array([AgentState.EXPOSED.value] * 3))
+    store.set_state(np.array([2]), np.array([AgentState.INFECTIOUS.value]))
+
+    assert store.state_counts[AgentState.SUSCEPTIBLE.value] == 7
+    assert store.state_counts[AgentState.EXPOSED.value] == 2
+    assert store.state_counts[AgentState.INFECTIOUS.value] == 1
+    assert list(store.get_agent_ids_by_state(AgentState.EXPOSED)) == [0, 1]
+
+
+def test_move_updates_cells():
+    """
+    Tests that placing and moving agents keeps positions and cells in sync
+    """
+    store = AgentStore(n_agents=2, width=5, height=5)
+    store.place(np.array([0, 1]), np.array([0, 1]), np.array([0, 1]))
+    store.move(np.array([1]), np.array([4]), np.array([3]))
+
+    assert store.get_agent_id(0, 0) == 0
+    assert store.get_agent_id(1, 1) == NO_AGENT
+    assert store.get_agent_id(4, 3) == 1
+    assert tuple(store.pos[1]) == (4, 3)
+
+
+def test_model_does_not_allocate_agent_objects():
+    """
+    Tests that the model keeps the grid, the observation and the agent
+    views consistent with the AgentStore
+    """
+    model = DiseaseSimModel(width=20, height=20, population_density=0.5)
+    store = model.agent_store
+    assert (store.cells != NO_AGENT).sum() == model.n_agents
+
+    for _agent in model.get_scheduler().agents:
+        x, y = _agent.pos
+        assert model.grid[x][y].unique_id == _agent.unique_id
+        assert model.get_observation()[x, y, _agent.state.value] == 1
+
+
+def test_move_agent_to_an_occupied_cell_raises():
+    """
+    Tests that moving an agent onto another agent raises,
+    leaving both agents in place
+    """
+    model = DiseaseSimModel(width=5, height=5, population_density=1.0)
+    store = model.agent_store
+    target = tuple(store.pos[1])
+    with pytest.raises(Exception, match="Cell not empty"):
+        model.move_agent(0, target)
+    assert store.get_agent_id(*target) == 1
+    assert (store.cells != NO_AGENT).sum() == model.n_agents
+
+
+def test_infection_pressure_is_maintained_incrementally():
+    """
+    Tests that the incrementally maintained infection pressure and at risk
+    cells match a full recomputation, as the agents change state and move
+    """
+    for toric in [True, False]:
+        model = DiseaseSimModel(
+            width=20,
+            height=20,
+            population_density=0.5,
+            initial_infection_fraction=0.1,
+            prob_infection=0.3,
+            prob_agent_movement=0.5,
+            max_timesteps=60,
+            toric=toric,
+            disease_planner_config={
+                "latent_period_mu":  2,
+                "latent_period_sigma":  0,
+                "incubation_period_mu":  5,
+                "incubation_period_sigma":  0,
+                "recovery_period_mu":  9,
+                "recovery_period_sigma":  0,
+            })
+        store = model.agent_store
+        for k in range(30):
+            model.tick()
+            infectious = np.isin(
+                store.state, store.INFECTIOUS_STATES)[store.cells] & \
+                (store.cells != NO_AGENT)
+            expected_pressure = grid_ops.count_neighbours(
+                infectious, toric=toric)
+            assert np.array_equal(
+                store.infection_pressure, expected_pressure)
+            occupants = store.cells[store.cells != NO_AGENT]
+            expected_at_risk = np.zeros_like(store.at_risk)
+            expected_at_risk[store.cells != NO_AGENT] = \
+                (store.state[occupants] == AgentState.SUSCEPTIBLE.value) & \
+                ~store.is_infection_scheduled[occupants]
+            expected_at_risk &= expected_pressure > 0
+            assert np.array_equal(store.at_risk, expected_at_risk)
+
+
+def test_at_risk_cells_exclude_the_shielded_agents():
+    """
+    Tests that the at risk cells are emptied once no susceptible agent
+    (without any infection scheduled) has an infectious neighbour
+    """
+    store = AgentStore(n_agents=3, width=5, height=5)
+    store.place(np.array([0, 1, 2]), np.array([1, 2, 4]), np.array([1, 1, 4]))
+    store.set_state(np.array([0]), np.array([AgentState.INFECTIOUS.value]))
+    assert [list(_c) for _c in store.get_at_risk_cells()] == [[2], [1]]
+
+    # A neighbour with an infection scheduled is no longer at risk
+    store.schedule_infections(np.array([1]))
+    assert len(store.get_at_risk_cells()[0]) == 0
+
+    # Neither are the recovered neighbours, nor the emptied cells
+    store.is_infection_scheduled[1] = False
+    store.set_state(np.array([1]), np.array([AgentState.RECOVERED.value]))
+    assert len(store.get_at_risk_cells()[0]) == 0
+    store.move(np.array([2]), np.array([0]), np.array([0]))
+    assert store.at_risk[0, 0]
+    store.move(np.array([2]), np.array([4]), np.array([4]))
+    assert not store.at_risk.any()
@@ -0,0 +1,38 @@
+#!/usr/bin/env python
+
+"""
+Tests the ContactNetwork
+"""
+import numpy as np
+import pytest
+
+from rog_rl.contact_network import ContactNetwork, NO_INFECTOR
+
+
+def test_running_R0():
+    """
+    Tests that R0 is the mean number of infections spread by the infectors
+    """
+    contact_network = ContactNetwork(n_agents=10)
+    assert contact_network.compute_R0() == 0
+
+    contact_network.register_infection_spread_by_id(0, 1, timestep=1)
+    contact_network.register_infection_spread_by_id(0, 2, timestep=1)
+    contact_network.register_infection_spreads_by_id(
+        np.array([1, 1, 2]), np.array([3, 4, 5]), timestep=2)
+
+    # Agent 0 infected 2 agents, agent 1 infected 2 and agent 2 infected 1
+    assert contact_network.compute_R0() == 5 / 3
+    assert list(contact_network.get_infected_by(1)) == [3, 4]
+    assert contact_network.infector[0] == NO_INFECTOR
+    assert contact_network.infection_timestep[5] == 2
+
+
+def test_single_infection_per_agent():
+    """
+    Tests that an agent can not be registered as infected twice
+    """
+    contact_network = ContactNetwork(n_agents=3)
+    contact_network.register_infection_spread_by_id(0, 1)
+    with pytest.raises(Exception):
+        contact_network.register_infection_spread_by_id(2, 1)
@@ -78,3 +78,85 @@ def tests_zero_sigma_gives_constant_values():
         assert latent_period == latent_period_mu
         assert incubation_period == incubation_period_mu
         assert recovery_period == recovery_period_mu
+
+
+def tests_bulk_disease_plans_are_valid():
+    """
+    Tests that the disease plans sampled in bulk respect the ordering
+    constraints of the periods, including when the constraints fall
+    far out in the tail of the distributions
+    """
+    disease_planner = SEIRDiseasePlanner(
+        latent_period_mu=8,
+        latent_period_sigma=4,
+        incubation_period_mu=20,
+        incubation_period_sigma=12,
+        recovery_period_mu=56,
+        recovery_period_sigma=4,
+        np_random=np.random.default_rng(42),
+        pool_size=100
+    )
+    base_timesteps = np.arange(1000)
+    disease_plans = disease_planner.get_disease_plans(
+        len(base_timesteps), base_timestep=base_timesteps)
+
+    assert disease_plans.shape == (1000, 4)
+    assert (disease_plans[:, 0] == base_timesteps).all()
+    assert (disease_plans[:, 1] >= disease_plans[:, 0]).all()
+    assert (np.diff(disease_plans[:, 1:], axis=1) > 0).all()
+
+    # Incubation periods way beyond the recovery period distribution
+    disease_planner.recovery_period_mu = 21
+    disease_plans = disease_planner.get_disease_plans(10000)
+    assert (np.diff(disease_plans[:, 1:], axis=1) > 0).all()
+
+
+def tests_pooled_plans_follow_the_periods():
+    """
+    Tests that the pool of pre-sampled disease progressions is discarded
+    when the periods of the planner change
+    """
+    disease_planner = SEIRDiseasePlanner(
+        latent_period_mu=8,
+        latent_period_sigma=4,
+        incubation_period_mu=20,
+        incubation_period_sigma=12,
+        recovery_period_mu=56,
+        recovery_period_sigma=4,
+        np_random=np.random.default_rng(42)
+    )
+    disease_planner.get_disease_plans(1)
+    disease_planner.recovery_period_mu = 200
+    disease_plans = disease_planner.get_disease_plans(5)
+    assert (disease_plans[:, 3] > 150).all()
+    assert disease_planner.sample_disease_progression()[2] > 150
+
+
+def tests_deterministic_plans_share_a_template():
+    """
+    Tests that deterministic planners build their plans from a shared
+    template, without drawing any random numbers
+    """
+    np_random = np.random.default_rng(42)
+    disease_planner = SEIRDiseasePlanner(
+        latent_period_mu=2,
+        latent_period_sigma=0,
+        incubation_period_mu=5,
+        incubation_period_sigma=0,
+        recovery_period_mu=14,
+        recovery_period_sigma=0,
+        np_random=np_random
+    )
+    disease_planner.get_disease_plans(10)
+    state = np_random.bit_generator.state
+
+    disease_plans = disease_planner.get_disease_plans(
+        3, base_timestep=np.array([0, 10, 20]))
+    assert disease_plans.tolist() == [
+        [0, 2, 5, 14], [10, 12, 15, 24], [20, 22, 25, 34]]
+    assert np_random.bit_generator.state == state
+
+    disease_plan = disease_planner.get_disease_plan(base_timestep=10)
+    assert [_event.update_timestep for _event in disease_plan] == \
+        [10, 12, 15, 24]
+    assert not hasattr(disease_plan[0], "__dict__")
@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+
+"""
+Tests the step options of the RogSimEnv
+"""
+import numpy as np
+
+from rog_rl import RogSimEnv
+from rog_rl.vaccination_response import VaccinationResponse
+
+
+def test_info_levels_and_trusted_actions():
+    """
+    Tests that the info levels and the trusted actions only change
+    the info returned by env.step, and not the simulation
+    """
+    config = dict(width=10, height=10, prob_agent_movement=0.2)
+    envs = {
+        "full": RogSimEnv(config=config),
+        "minimal": RogSimEnv(config=dict(config, info_level="minimal")),
+        "none": RogSimEnv(config=dict(
+            config, info_level="none", trusted_actions=True)),
+    }
+    for env in envs.values():
+        env.seed(1)
+        env.reset()
+    envs["full"].action_space.seed(1)
+
+    for k in range(30):
+        action = envs["full"].action_space.sample()
+        results = {
+            _level: env.step(action) for _level, env in envs.items()}
+        observations, rewards, dones, infos = zip(*results.values())
+        for observation in observations[1:]:
+            assert np.array_equal(observation, observations[0])
+        assert len(set(rewards)) == 1 and len(set(dones)) == 1
+
+        n_agents = envs["full"]._model.n_agents
+        assert np.allclose(
+            infos[1]["state_counts"] / n_agents,
+            [infos[0][_key] for _key in infos[0] if _key != "R0/10"])
+        assert list(infos[1].keys()) == ["state_counts"]
+        assert infos[2] == {}
+        if dones[0]:
+            break
+
+
+def test_batched_vaccinations():
+    """
+    Tests that vaccinating a batch of cells has the same effect, and
+    responses, as the equivalent sequence of VACCINATE actions
+    """
+    np_random = np.random.RandomState(1)
+    for engine in ["mesa", "numpy"]:
+        config = dict(
+            width=10, height=10, engine=engine, vaccine_density=0.2)
+        env = RogSimEnv(config=config)
+        batched_env = RogSimEnv(config=config)
+        env.seed(1)
+        batched_env.seed(1)
+        env.reset()
+        batched_env.reset()
+
+        for k in range(4):
+            # Includes repeated cells, and exhausts the vaccines
+            cells = np_random.randint(0, 10, size=(6, 2))
+            cells[1] = cells[0]
+            responses = []
+            for x, y in cells:
+                responses.append(
+                    env._model.vaccinate_cell(x, y)[1].value)
+            if VaccinationResponse.AGENT_VACCINES_EXHAUSTED.value in responses:
+                # The simulation is run to completion, as in env.step
+                while env._model.is_running():
+                    env._model.tick()
+            else:
+                env._model.tick()
+
+            observation, _, done, info = batched_env.vaccinate_cells(
+                cells, tick=True)
+            assert list(info["vaccination_responses"]) == responses
+            assert np.array_equal(observation, env.get_observation())
+            assert np.array_equal(
+                env._model.get_state_counts(),
+                batched_env._model.get_state_counts())
+            if done:
+                break
+        assert responses[-1] == \
+            VaccinationResponse.AGENT_VACCINES_EXHAUSTED.value
+
+
+def test_macro_steps():
+    """
+    Tests that a STEP action with ticks_per_step=k matches k single tick
+    STEP actions, and that the tick rewards are the rewards of every tick
+    """
+    for engine in ["mesa", "numpy"]:
+        config = dict(
+            width=10, height=10, engine=engine,
+            max_simulation_timesteps=50, report_tick_rewards=True)
+        env = RogSimEnv(config=config)
+        macro_env = RogSimEnv(config=dict(config, ticks_per_step=4))
+        env.seed(1)
+        macro_env.seed(1)
+        env.reset()
+        macro_env.reset()
+        assert macro_env._max_episode_steps == \
+            13 + macro_env._model.n_vaccines
+
+        done = False
+        while not done:
+            rewards = []
+            for k in range(4):
+                _, reward, done, info = env.step([0, 0, 0])
+                assert list(info["tick_rewards"]) == [reward]
+                rewards.append(reward)
+                if done:
+                    break
+            observation, reward, macro_done, info = \
+                macro_env.step([0, 0, 0])
+            assert done == macro_done
+            assert np.array_equal(observation, env.get_observation())
+            assert np.allclose(info["tick_rewards"], rewards)
+            assert np.isclose(reward, sum(rewards))
+        assert env._model.get_timestep() == \
+            macro_env._model.get_timestep()
+
+
+def test_in_place_reset():
+    """
+    Tests that the episodes after an in place reset are the same as
+    with a newly built simulation, and that the allocations are reused
+    """
+    for engine in ["mesa", "numpy"]:
+        config = dict(
+            width=10, height=10, engine=engine,
+            prob_agent_movement=0.1, vaccine_density=0.2,
+            observation_pooling_tile_size=3,
+            report_observation_deltas=True)
+        env = RogSimEnv(config=config)
+        rebuilding_env = RogSimEnv(config=dict(config, in_place_reset=False))
+        env.seed(1)
+        rebuilding_env.seed(1)
+        env.action_space.seed(1)
+
+        for episode in range(3):
+            observation = env.reset()
+            rebuilt_observation = rebuilding_env.reset()
+            if episode == 0:
+                model = env._model
+                observation_buffer = model.observation_buffer
+            assert env._model is model
+            assert model.observation_buffer is observation_buffer
+
+            done = False
+            while not done:
+                assert np.array_equal(
+                    observation["pooled"], rebuilt_observation["pooled"])
+                action = env.action_space.sample()
+                observation, reward, done, info = env.step(action)
+                rebuilt_observation, rebuilt_reward, rebuilt_done, \
+                    rebuilt_info = rebuilding_env.step(action)
+                assert reward == rebuilt_reward and done == rebuilt_done
+                assert info["R0/10"] == rebuilt_info["R0/10"]
+                assert np.array_equal(
+                    info["observation_deltas"],
+                    rebuilt_info["observation_deltas"])
+            assert np.array_equal(
+                model.get_observation(),
+                rebuilding_env._model.get_observation())
+            assert np.array_equal(
+                model.datacollector.get_state_counts(),
+                rebuilding_env._model.datacollector.get_state_counts())
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+
+"""
+Tests the MetricsRecorder
+"""
+import numpy as np
+
+from rog_rl.agent_state import AgentState
+from rog_rl.metrics_recorder import MetricsRecorder
+from rog_rl.model import DiseaseSimModel
+
+
+def _state_counts(susceptible):
+    state_counts = np.zeros(len(AgentState), dtype=np.int64)
+    state_counts[AgentState.SUSCEPTIBLE.value] = susceptible
+    return state_counts
+
+
+def test_susceptible_streak():
+    """
+    Tests that the early stopping check matches the check over
+    the last N recorded susceptible values
+    """
+    recorder = MetricsRecorder(capacity=20)
+    susceptible_counts = [10, 9, 9, 9, 7, 7, 7, 7, 7]
+    for k, _count in enumerate(susceptible_counts):
+        recorder.record(_state_counts(_count), 0)
+        # The model only checks once at least `patience` records exist
+        for patience in range(1, k + 2):
+            expected = len(set(susceptible_counts[:k + 1][-patience:])) == 1
+            assert recorder.is_susceptible_population_stagnant(patience) == \
+                expected
+
+
+def test_ring_buffer_keeps_the_latest_records():
+    """
+    Tests that the records wrap around once the capacity is exceeded
+    """
+    recorder = MetricsRecorder(capacity=3)
+    for k in range(5):
+        recorder.record(_state_counts(k), k)
+
+    assert len(recorder) == 3
+    assert list(recorder.model_vars["Susceptible"]) == [2, 3, 4]
+    assert list(recorder.model_vars["R0/10"]) == [0.2, 0.3, 0.4]
+
+
+def test_model_records_every_timestep():
+    """
+    Tests that the model records the population fractions at every step
+    """
+    model = DiseaseSimModel(
+        width=10,
+        height=10,
+        population_density=1.0,
+        max_timesteps=10,
+        early_stopping_patience=20)
+    for k in range(5):
+        model.tick()
+
+    model_vars = model.datacollector.model_vars
+    assert len(model_vars["Susceptible"]) == 6
+    assert model_vars["Susceptible"][-1] == \
+        model.get_population_fraction_by_state(AgentState.SUSCEPTIBLE)
+
+    df = model.datacollector.get_model_vars_dataframe()
+    assert df.shape == (6, 7)
+    assert np.allclose(df.iloc[:, :6].sum(axis=1), 1.0)
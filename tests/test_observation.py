@@ -0,0 +1,347 @@
+#!/usr/bin/env python
+
+"""
+Tests the observation modes and dtypes
+"""
+import numpy as np
+
+from rog_rl import RogSimEnv, RogSimVecEnv
+from rog_rl.env import INFECTED_STATES
+from rog_rl.agent_state import AgentState
+from rog_rl.observation import grid_view, to_label_map, window
+from rog_rl.wrappers import PackedObservationWrapper
+
+
+def _run(env, n_steps=20):
+    observations = [env.reset()]
+    for k in range(n_steps):
+        action = env.action_space.sample()
+        observation, _, done, _ = env.step(action)
+        observations.append(observation)
+    return observations
+
+
+def test_observation_matches_observation_space():
+    """
+    Tests that the observations have the dtype and shape advertised
+    by the observation_space for every engine, mode and dtype
+    """
+    for engine in ["mesa", "numpy"]:
+        for observation_mode, observation_dtype in [
+                ("one_hot", "float32"),
+                ("one_hot", "uint8"),
+                ("one_hot", "bool"),
+                ("label_map", "float32")]:
+            env = RogSimEnv(config=dict(
+                width=10, height=10, engine=engine,
+                prob_agent_movement=0.2,
+                observation_mode=observation_mode,
+                observation_dtype=observation_dtype))
+            env.seed(1)
+            for observation in _run(env):
+                assert observation.dtype == env.observation_space.dtype
+                assert env.observation_space.contains(observation)
+
+
+def test_label_map_matches_one_hot():
+    """
+    Tests that the label map observations encode the same states as
+    the one hot observations
+    """
+    for engine in ["mesa", "numpy"]:
+        observations = {}
+        for observation_mode in ["one_hot", "label_map"]:
+            env = RogSimEnv(config=dict(
+                width=10, height=10, engine=engine,
+                prob_agent_movement=0.2,
+                observation_mode=observation_mode))
+            env.seed(1)
+            env.action_space.seed(1)
+            observations[observation_mode] = _run(env)
+
+        for one_hot, label_map in zip(
+                observations["one_hot"], observations["label_map"]):
+            assert label_map.shape == (10, 10)
+            assert np.array_equal(to_label_map(one_hot), label_map)
+
+
+def test_vec_env_label_map():
+    """
+    Tests the label map observations of the batched environment
+    """
+    env = RogSimVecEnv(num_envs=4, config=dict(
+        width=10, height=10, observation_mode="label_map"))
+    env.seed(1)
+    observations = env.reset()
+    assert observations.shape == (4, 10, 10)
+    assert observations.dtype == np.int8
+    n_agents = env._model.n_agents
+    assert ((observations >= 0).sum(axis=(1, 2)) == n_agents).all()
+    assert (observations <= AgentState.VACCINATED.value).all()
+
+
+def test_observation_deltas():
+    """
+    Tests that replaying the reported observation deltas on the initial
+    observation reproduces the observations of every step
+    """
+    for engine in ["mesa", "numpy"]:
+        env = RogSimEnv(config=dict(
+            width=10, height=10, engine=engine,
+            prob_agent_movement=0.2,
+            observation_mode="label_map",
+            report_observation_deltas=True))
+        env.seed(1)
+        label_map = env.reset().copy()
+        for k in range(30):
+            observation, _, done, info = env.step(env.action_space.sample())
+            deltas = info["observation_deltas"]
+            xs, ys, old_states, new_states = deltas.T
+            assert np.array_equal(label_map[xs, ys], old_states)
+            label_map[xs, ys] = new_states
+            assert np.array_equal(label_map, observation)
+            if done:
+                break
+
+
+def test_packed_observations_unpack_exactly():
+    """
+    Tests that the packed observations are unpacked into exactly
+    the observations of the wrapped environment
+    """
+    for observation_mode, observation_dtype, observation_layout, \
+            observation_window in [
+                ("one_hot", "float32", "whc", None),
+                ("one_hot", "bool", "whc", None),
+                ("label_map", "float32", "whc", None),
+                ("one_hot", "float32", "chw", None),
+                ("label_map", "float32", "chw", None),
+                ("one_hot", "float32", "chw", (3, 4)),
+                ("label_map", "float32", "whc", (3, 4))]:
+        config = dict(
+            width=9, height=7,
+            prob_agent_movement=0.2,
+            observation_mode=observation_mode,
+            observation_dtype=observation_dtype,
+            observation_layout=observation_layout,
+            observation_window=observation_window)
+        env = RogSimEnv(config=config)
+        packed_env = PackedObservationWrapper(RogSimEnv(config=config))
+        env.seed(1)
+        packed_env.seed(1)
+        env.action_space.seed(1)
+
+        observations = [env.reset().copy()]
+        packed_observations = [packed_env.reset()]
+        for k in range(10):
+            action = env.action_space.sample()
+            observations.append(env.step(action)[0].copy())
+            packed_observations.append(packed_env.step(action)[0])
+
+        assert packed_env.observation_space.contains(packed_observations[0])
+        # Unpack all of them at once
+        unpacked = packed_env.unpack(np.stack(packed_observations))
+        assert unpacked.dtype == env.observation_space.dtype
+        assert np.array_equal(unpacked, np.stack(observations))
+
+
+def test_channel_first_layout_and_out_buffers():
+    """
+    Tests that the "chw" observations are the transposes of the "whc" ones,
+    and that they are written into the provided out buffers
+    """
+    for engine in ["mesa", "numpy"]:
+        envs = {}
+        for observation_layout in ["whc", "chw"]:
+            env = RogSimEnv(config=dict(
+                width=9, height=7, engine=engine,
+                prob_agent_movement=0.2,
+                observation_layout=observation_layout))
+            env.seed(1)
+            envs[observation_layout] = env
+
+        buffer = np.zeros(
+            (11, ) + envs["chw"].observation_space.shape, dtype=np.float32)
+        assert buffer.shape[1:] == (6, 7, 9)
+        whc_observation = envs["whc"].reset()
+        observation = envs["chw"].reset(out=buffer[0])
+        assert np.shares_memory(observation, buffer[0])
+        assert envs["chw"]._model.get_observation().flags["C_CONTIGUOUS"]
+
+        envs["whc"].action_space.seed(1)
+        for k in range(1, 11):
+            action = envs["whc"].action_space.sample()
+            whc_observation = envs["whc"].step(action)[0]
+            envs["chw"].step(action, out=buffer[k])
+            assert np.array_equal(
+                buffer[k], whc_observation.transpose(2, 1, 0))
+
+    vec_env = RogSimVecEnv(num_envs=2, config=dict(
+        width=9, height=7, observation_layout="chw"))
+    assert vec_env.reset().shape == (2, 6, 7, 9)
+
+
+def test_pooled_observations():
+    """
+    Tests that the incrementally maintained tile counts match the counts
+    recomputed from the full observation, and that the crops match
+    the full observation
+    """
+    for engine in ["mesa", "numpy"]:
+        config = dict(
+            width=10, height=7, engine=engine,
+            prob_agent_movement=0.2,
+            vaccine_density=0.2)
+        env = RogSimEnv(config=config)
+        pooled_env = RogSimEnv(config=dict(
+            config,
+            observation_pooling_tile_size=3,
+            observation_crop=(2, 1, 5, 4)))
+        env.seed(1)
+        pooled_env.seed(1)
+        env.action_space.seed(1)
+
+        observation = env.reset()
+        pooled_observation = pooled_env.reset()
+        for k in range(20):
+            assert pooled_env.observation_space.contains(pooled_observation)
+            padded = np.zeros((12, 9, len(AgentState)))
+            padded[:10, :7] = observation
+            expected_counts = padded.reshape(4, 3, 3, 3, -1).sum(axis=(1, 3))
+            assert np.array_equal(
+                pooled_observation["pooled"], expected_counts)
+            assert np.array_equal(
+                pooled_observation["crop"], observation[2:7, 1:5])
+
+            action = env.action_space.sample()
+            observation = env.step(action)[0]
+            pooled_observation = pooled_env.step(action)[0]
+
+
+def test_action_mask():
+    """
+    Tests that the action mask matches the susceptible cells of the
+    observation, and that the VACCINATE actions sampled from it succeed
+    """
+    for engine in ["mesa", "numpy"]:
+        env = RogSimEnv(config=dict(
+            width=10, height=10, engine=engine,
+            prob_agent_movement=0.2,
+            vaccine_density=0.5,
+            report_action_mask=True))
+        env.seed(1)
+        np_random = np.random.RandomState(1)
+        observation = env.reset()
+        action_mask = env.get_action_mask()
+        for k in range(30):
+            assert np.array_equal(
+                action_mask, observation[..., AgentState.SUSCEPTIBLE.value])
+            if k % 3 == 0 or not action_mask.any():
+                action = [0, 0, 0]
+            else:
+                xs, ys = np.nonzero(action_mask)
+                _index = np_random.randint(len(xs))
+                action = [1, xs[_index], ys[_index]]
+            n_vaccinated = env._model.get_state_counts()[
+                AgentState.VACCINATED.value]
+            observation, _, done, info = env.step(action)
+            assert np.array_equal(info["action_mask"], action_mask)
+            if action[0] == 1:
+                assert env._model.get_state_counts()[
+                    AgentState.VACCINATED.value] == n_vaccinated + 1
+            if done:
+                break
+
+
+def test_windowed_observations():
+    """
+    Tests that the windowed observations match the windows of the full
+    observation centred on the focus cell
+    """
+    for toric in [True, False]:
+        for observation_layout in ["whc", "chw"]:
+            config = dict(
+                width=12, height=9, toric=toric,
+                prob_agent_movement=0.2,
+                vaccine_density=0.5,
+                observation_layout=observation_layout)
+            env = RogSimEnv(config=config)
+            windowed_env = RogSimEnv(config=dict(
+                config, observation_window=(5, 4)))
+            env.seed(1)
+            windowed_env.seed(1)
+            env.action_space.seed(1)
+
+            observation = env.reset()
+            windowed_observation = windowed_env.reset()
+            for k in range(20):
+                assert windowed_env.observation_space.contains(
+                    windowed_observation)
+                x, y = windowed_env.get_focus_cell()
+                padded = np.zeros((12 + 6, 9 + 6, len(AgentState)))
+                if toric:
+                    padded[...] = np.pad(
+                        grid_view(observation, observation_layout),
+                        ((3, 3), (3, 3), (0, 0)), mode="wrap")
+                else:
+                    padded[3:-3, 3:-3] = grid_view(
+                        observation, observation_layout)
+                expected = padded[x + 1:x + 6, y + 1:y + 5]
+                assert np.array_equal(
+                    grid_view(windowed_observation, observation_layout),
+                    expected)
+
+                action = env.action_space.sample()
+                observation = env.step(action)[0]
+                windowed_observation = windowed_env.step(action)[0]
+
+
+def test_window_is_a_view_within_the_grid():
+    """
+    Tests that the windows lying within the grid are views of
+    the observation
+    """
+    observation = np.zeros((10, 8, len(AgentState)), dtype=np.float32)
+    assert np.shares_memory(window(observation, 5, 4, 3, 3), observation)
+    assert not np.shares_memory(window(observation, 0, 4, 3, 3), observation)
+    label_map = window(
+        np.zeros((10, 8), dtype=np.int8), 0, 0, 3, 3, toric=False)
+    assert (label_map[0] == -1).all() and (label_map[1:, 1:] == 0).all()
+
+
+def test_infections_focus():
+    """
+    Tests that the windows focused on the infections hold the most
+    infected agents
+    """
+    env = RogSimEnv(config=dict(
+        width=12, height=12,
+        initial_infection_fraction=0.02,
+        observation_window=(3, 3),
+        observation_window_focus="infections"))
+    env.seed(1)
+    env.reset()
+    model = env._model
+    infected = sum(
+        model.observation[..., _state.value] for _state in [
+            AgentState.EXPOSED, AgentState.INFECTIOUS,
+            AgentState.SYMPTOMATIC])
+    window_counts = sum(
+        np.roll(infected, (dx, dy), axis=(0, 1))
+        for dx in [-1, 0, 1] for dy in [-1, 0, 1])
+    x, y = env.get_focus_cell()
+    assert window_counts[x, y] == window_counts.max() > 0
+
+    # Without infected agents, the focus falls back to the cell of
+    # the last VACCINATE action (the centre of the grid before any)
+    env = RogSimEnv(config=dict(
+        width=12, height=12,
+        initial_infection_fraction=0,
+        observation_window=(3, 3),
+        observation_window_focus="infections"))
+    env.seed(1)
+    env.reset()
+    assert env._model.find_densest_window(3, 3, INFECTED_STATES) is None
+    assert env.get_focus_cell() == (6, 6)
+    env.step([1, 2, 9])
+    assert env.get_focus_cell() == (2, 9)
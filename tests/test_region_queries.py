@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+
+"""
+Tests the region queries of the DiseaseSimModel
+"""
+import numpy as np
+
+from rog_rl.agent_state import AgentState
+from rog_rl.model import DiseaseSimModel
+from rog_rl.numpy_model import NumpyDiseaseSimModel
+
+
+def _brute_force_counts(model, x0, y0, x1, y1):
+    observation = model.observation
+    xs = np.arange(x0, x1)
+    ys = np.arange(y0, y1)
+    if model.toric:
+        xs, ys = xs % model.width, ys % model.height
+    else:
+        xs = xs[(xs >= 0) & (xs < model.width)]
+        ys = ys[(ys >= 0) & (ys < model.height)]
+    return observation[np.ix_(xs, ys)].sum(axis=(0, 1))
+
+
+def test_rectangle_counts_match_brute_force():
+    """
+    Tests the rectangle counts (including the ones wrapping around the
+    grid edges) against brute force counts, as the simulation progresses
+    """
+    np_random = np.random.RandomState(0)
+    for engine in [DiseaseSimModel, NumpyDiseaseSimModel]:
+        for toric in [True, False]:
+            model = engine(
+                width=11,
+                height=8,
+                population_density=0.6,
+                prob_agent_movement=0.3,
+                toric=toric)
+            for k in range(10):
+                model.tick()
+                rectangles = []
+                for _ in range(20):
+                    x0 = np_random.randint(-5, 11)
+                    y0 = np_random.randint(-5, 8)
+                    rectangles.append((
+                        x0, y0,
+                        x0 + np_random.randint(0, 12),
+                        y0 + np_random.randint(0, 9)))
+                counts = model.count_agents_in_rectangles(rectangles)
+                for _rectangle, _counts in zip(rectangles, counts):
+                    assert np.array_equal(
+                        _counts, _brute_force_counts(model, *_rectangle))
+
+
+def test_radius_counts():
+    """
+    Tests the counts of the agents within a radius of cells
+    """
+    model = DiseaseSimModel(width=10, height=10, population_density=1.0)
+    n_susceptible = model.count_agents_within_radius(
+        [0, 5], [0, 5], radius=1, state=AgentState.SUSCEPTIBLE)
+    n_agents = model.count_agents_within_radius(
+        [0, 5], [0, 5], radius=1).sum(axis=1)
+    assert list(n_agents) == [9, 9]
+    assert (n_susceptible <= n_agents).all()
+
+    # Counts are updated after vaccinations (in between ticks)
+    before = model.count_agents_in_rectangle(
+        0, 0, 10, 10, state=AgentState.VACCINATED)
+    model.n_vaccines = 1
+    x, y = model.agent_store.pos[
+        model.agent_store.get_agent_ids_by_state(AgentState.SUSCEPTIBLE)[0]]
+    model.vaccinate_cell(x, y)
+    assert model.count_agents_in_rectangle(
+        0, 0, 10, 10, state=AgentState.VACCINATED) == before + 1
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+
+"""
+Tests the CustomScheduler
+"""
+from rog_rl.agent_state import AgentState
+from rog_rl.model import DiseaseSimModel
+
+
+def test_transitions_executed_at_update_timestep():
+    """
+    Tests that the seeded infections progress through all the states
+    exactly at the timesteps of their disease plan
+    """
+    model = DiseaseSimModel(
+        width=10,
+        height=10,
+        population_density=1.0,
+        initial_infection_fraction=0.1,
+        prob_infection=0.0,
+        max_timesteps=100,
+        early_stopping_patience=100,
+        disease_planner_config={
+            "latent_period_mu":  2,
+            "latent_period_sigma":  0,
+            "incubation_period_mu":  5,
+            "incubation_period_sigma":  0,
+            "recovery_period_mu":  9,
+            "recovery_period_sigma":  0,
+        }
+    )
+    scheduler = model.get_scheduler()
+    expected_states = [AgentState.EXPOSED] * 2 + \
+        [AgentState.INFECTIOUS] * 3 + \
+        [AgentState.SYMPTOMATIC] * 4 + \
+        [AgentState.RECOVERED] * 5
+
+    for expected_state in expected_states:
+        model.tick()
+        assert scheduler.get_agent_count_by_state(expected_state) == 10
+        # Only the future transitions should still be pending
+        assert all(
+            _timestep >= scheduler.steps
+            for _timestep in scheduler._transition_wheel.keys())
+
+
+def test_no_movement_without_movement_probability():
+    """
+    Tests that no agent moves when prob_agent_movement is 0
+    """
+    model = DiseaseSimModel(
+        width=10,
+        height=10,
+        population_density=0.5,
+        prob_agent_movement=0.0
+    )
+    positions = {
+        _agent.unique_id: _agent.pos
+        for _agent in model.get_scheduler().agents}
+    for k in range(10):
+        model.tick()
+    for _agent in model.get_scheduler().agents:
+        assert _agent.pos == positions[_agent.unique_id]
+
+
+def test_bulk_movement_keeps_the_grid_consistent():
+    """
+    Tests that moving the agents in bulk keeps the grid, the positions
+    and the observation consistent
+    """
+    model = DiseaseSimModel(
+        width=10,
+        height=10,
+        population_density=0.5,
+        prob_agent_movement=1.0
+    )
+    store = model.agent_store
+    initial_positions = store.pos.copy()
+    for k in range(10):
+        model.tick()
+        xs, ys = store.pos[:, 0], store.pos[:, 1]
+        assert list(store.cells[xs, ys]) == list(range(model.n_agents))
+        assert (store.cells != -1).sum() == model.n_agents
+        assert model.get_observation().sum() == model.n_agents
+        assert (model.get_observation()[xs, ys, store.state] == 1).all()
+    assert (store.pos != initial_positions).any()
@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+
+"""
+Tests the skipping of the quiescent intervals of the simulations
+"""
+import numpy as np
+
+from rog_rl.agent_state import AgentState
+from rog_rl.batched_model import BatchedDiseaseSimModel
+from rog_rl.model import DiseaseSimModel
+from rog_rl.numpy_model import NumpyDiseaseSimModel
+
+
+def _build_model(model_class, seed, **kwargs):
+    return model_class(
+        width=12,
+        height=12,
+        population_density=0.4,
+        initial_infection_fraction=0.05,
+        prob_infection=0.3,
+        disease_planner_config={
+            "latent_period_mu":  6,
+            "latent_period_sigma":  1,
+            "incubation_period_mu":  9,
+            "incubation_period_sigma":  1,
+            "recovery_period_mu":  14,
+            "recovery_period_sigma":  1,
+        },
+        seed=seed,
+        **kwargs)
+
+
+def test_skipping_matches_ticking():
+    """
+    Tests that running the simulations with tick_many (which skips the
+    quiescent intervals) matches ticking through every timestep
+    """
+    for model_class in [DiseaseSimModel, NumpyDiseaseSimModel]:
+        for seed in range(6):
+            for max_timesteps, early_stopping_patience in [
+                    (150, 14), (150, 9), (75, 14), (150, 0)]:
+                kwargs = dict(
+                    max_timesteps=max_timesteps,
+                    early_stopping_patience=early_stopping_patience)
+                model = _build_model(model_class, seed, **kwargs)
+                skipping_model = _build_model(model_class, seed, **kwargs)
+
+                vaccinated = False
+                while model.is_running():
+                    model.tick()
+                    skipping_model.tick_many(5)
+                    for k in range(4):
+                        if model.is_running():
+                            model.tick()
+                    assert model.get_timestep() == \
+                        skipping_model.get_timestep()
+                    assert model.is_running() == skipping_model.is_running()
+                    assert np.array_equal(
+                        model.get_observation(),
+                        skipping_model.get_observation())
+
+                    # Vaccinations in between ticks reset the
+                    # susceptible streak
+                    if not vaccinated and model.is_quiescent():
+                        x, y = np.argwhere(model.observation[
+                            ..., AgentState.SUSCEPTIBLE.value])[0]
+                        model.n_vaccines = skipping_model.n_vaccines = 1
+                        model.vaccinate_cell(x, y)
+                        skipping_model.vaccinate_cell(x, y)
+                        vaccinated = True
+
+                assert np.array_equal(
+                    model.datacollector.get_state_counts(),
+                    skipping_model.datacollector.get_state_counts())
+                assert model.datacollector.susceptible_streak == \
+                    skipping_model.datacollector.susceptible_streak
+
+
+def test_latent_period_is_skipped():
+    """
+    Tests that the latent period of the seed infections is skipped
+    at once
+    """
+    for model_class in [DiseaseSimModel, NumpyDiseaseSimModel]:
+        model = model_class(width=10, height=10, seed=1)
+        # The seed infections are due at the first tick
+        assert model.skip_quiescent_ticks(100) == 0
+        model.tick()
+        assert model.get_state_counts()[AgentState.EXPOSED.value] > 0
+        # The agents become INFECTIOUS at the timestep 8
+        assert model.skip_quiescent_ticks(100) == 7
+        assert model.get_timestep() == 8
+        assert model.datacollector.n_records == 9
+        assert model.skip_quiescent_ticks(100) == 0
+
+        # The skipping stops at the max_timesteps
+        model = model_class(width=10, height=10, seed=1, max_timesteps=5)
+        model.tick()
+        assert model.skip_quiescent_ticks(100) == 4
+        assert not model.is_running()
+
+
+def test_stop_on_epidemic_end():
+    """
+    Tests that stopping the simulations as soon as the epidemic is over
+    records the same metrics as the early stopping
+    """
+    for model_class in [DiseaseSimModel, NumpyDiseaseSimModel]:
+        for seed in range(6):
+            for early_stopping_patience in [14, 9]:
+                models = [
+                    _build_model(
+                        model_class, seed,
+                        max_timesteps=150,
+                        early_stopping_patience=early_stopping_patience,
+                        prob_agent_movement=0.1,
+                        stop_on_epidemic_end=stop_on_epidemic_end)
+                    for stop_on_epidemic_end in [False, True]]
+                n_ticks = []
+                for model in models:
+                    n_ticks.append(0)
+                    while model.is_running():
+                        model.tick()
+                        n_ticks[-1] += 1
+                assert n_ticks[1] <= n_ticks[0]
+                assert models[0].get_timestep() == models[1].get_timestep()
+                assert np.array_equal(
+                    models[0].datacollector.get_state_counts(),
+                    models[1].datacollector.get_state_counts())
+                assert np.array_equal(
+                    models[0].datacollector.model_vars["R0/10"],
+                    models[1].datacollector.model_vars["R0/10"])
+
+
+def test_batched_stop_on_epidemic_end():
+    """
+    Tests that the batched simulations stopped as soon as the epidemic
+    is over end at the same timesteps as with the early stopping
+    """
+    for max_timesteps in [200, 85]:
+        models = []
+        for stop_on_epidemic_end in [False, True]:
+            model = BatchedDiseaseSimModel(
+                n_envs=16, width=12, height=12,
+                population_density=0.4,
+                initial_infection_fraction=0.05,
+                prob_infection=0.3,
+                disease_planner_config={
+                    "latent_period_mu":  6,
+                    "latent_period_sigma":  0,
+                    "incubation_period_mu":  9,
+                    "incubation_period_sigma":  0,
+                    "recovery_period_mu":  14,
+                    "recovery_period_sigma":  0,
+                },
+                max_timesteps=max_timesteps,
+                early_stopping_patience=30,
+                seed=1,
+                stop_on_epidemic_end=stop_on_epidemic_end)
+            model.reset()
+            n_ticks = np.zeros(16, dtype=np.int64)
+            while model.running.any():
+                n_ticks += model.running
+                model.tick(model.running.copy())
+            models.append(model)
+        assert (n_ticks < models[1].steps).any()
+        assert np.array_equal(models[0].steps, models[1].steps)
+        assert np.array_equal(
+            models[0].state_counts, models[1].state_counts)
+
+
+def test_headless_run_to_completion():
+    """
+    Tests that running the simulations to completion in headless mode
+    ends with the same observation (and derived arrays) as ticking
+    through every timestep
+    """
+    for model_class in [DiseaseSimModel, NumpyDiseaseSimModel]:
+        models = []
+        for headless in [False, True]:
+            model = _build_model(
+                model_class, 1, prob_agent_movement=0.1,
+                pooling_tile_size=5)
+            model.tick()
+            model.enable_change_log()
+            model.run_to_completion(headless=headless)
+            models.append(model)
+
+        assert models[1].get_timestep() == models[0].get_timestep()
+        assert np.array_equal(
+            models[1].get_observation(), models[0].get_observation())
+        assert np.array_equal(
+            models[1].get_pooled_observation(),
+            models[0].get_pooled_observation())
+        assert np.array_equal(
+            models[1].get_susceptible_mask(),
+            models[0].get_susceptible_mask())
+        assert np.array_equal(
+            models[1].get_observation_deltas(),
+            models[0].get_observation_deltas())
+        assert np.array_equal(
+            models[1].datacollector.get_state_counts(),
+            models[0].datacollector.get_state_counts())
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+
+"""
+Tests the batched vector environment
+"""
+import numpy as np
+
+from rog_rl import RogSimVecEnv
+from rog_rl.agent_state import AgentState
+from rog_rl.batched_model import BatchedDiseaseSimModel
+from rog_rl.model import DiseaseSimModel
+
+
+def test_deterministic_spread_matches_mesa_model():
+    """
+    Every simulation in the batch should follow the exact same (fully
+    deterministic) trajectory as the mesa based model
+    """
+    config = dict(
+        width=20,
+        height=20,
+        population_density=1.0,
+        initial_infection_fraction=1.0/400,
+        initial_vaccination_fraction=0,
+        prob_infection=1.0
+    )
+    model = DiseaseSimModel(seed=42, **config)
+    batched_model = BatchedDiseaseSimModel(n_envs=4, seed=42, **config)
+    batched_model.reset()
+
+    while model.is_running():
+        model.tick()
+        batched_model.tick()
+        for _state in AgentState:
+            assert np.allclose(
+                batched_model.get_population_fraction_by_state(_state),
+                model.get_population_fraction_by_state(_state))
+        assert np.all(batched_model.running == model.is_running())
+
+
+def test_vec_env_step():
+    """
+    Tests the shapes of the batched step outputs, and that the
+    sub-environments are reset automatically
+    """
+    num_envs = 8
+    env = RogSimVecEnv(num_envs=num_envs, config=dict(width=10, height=10))
+    env.seed(42)
+    observation = env.reset()
+    assert observation.shape == (num_envs, 10, 10, len(AgentState))
+
+    n_dones = 0
+    for k in range(50):
+        actions = env.action_space.sample()
+        assert actions.shape == (num_envs, 3)
+        observation, reward, done, info = env.step(actions)
+        assert observation.shape == (num_envs, 10, 10, len(AgentState))
+        assert reward.shape == done.shape == (num_envs, )
+        assert info["R0/10"].shape == (num_envs, )
+        assert np.all(observation.sum(axis=(1, 2, 3)) == env._model.n_agents)
+        n_dones += done.sum()
+    assert n_dones > 0
+    assert env._model.running.all()